@@ -29,13 +29,19 @@ setuptools.setup(
                       "six~=1.16.0",
                       "configobj~=5.0.6",
                       "argcomplete~=2.0.0",
+                      "numpy~=1.23.2",
                       "pandas~=1.4.4",
                       "plotly~=5.10.0",
                       "pywin32"],
+    extras_require={"export": ["msgpack~=1.0.4", "pyarrow~=9.0.0"]},
     scripts=[],
     entry_points={
         'console_scripts': ['ac-tools=sim_racing_tools.assetto_corsa.scripts.ac_tools:main',
-                            'check-engine=sim_racing_tools.automation.scripts.check_engine:main'],
+                            'check-engine=sim_racing_tools.automation.scripts.check_engine:main',
+                            'car-cache=sim_racing_tools.automation.scripts.car_cache:main',
+                            'export-index=sim_racing_tools.automation.scripts.export_index:main',
+                            'sandbox-snapshot=sim_racing_tools.automation.scripts.sandbox_snapshot:main',
+                            'sandbox-changes=sim_racing_tools.automation.scripts.sandbox_changes:main'],
     },
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,373 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import concurrent.futures
+
+from sim_racing_tools.automation.car_file_decoder import CarFile, get_values, BLOB_MARK, TEXT, NUMBER, TRUE, \
+    FALSE, ATTRIBUTE_SECTION, LENGTH, DOUBLE, SECTION_HEADER
+
+UID_PATH = "Car/Variant/UID"
+
+
+def get_peak_rss():
+    """
+    Returns:
+        the peak resident set size of this process in bytes or None if it can't be determined on this platform
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+
+def read_then_parse(car_file_paths):
+    for car_file_path in car_file_paths:
+        with open(car_file_path, "rb") as f:
+            car = CarFile(os.path.basename(car_file_path), f.read())
+            car.parse()
+            car.get_data()["Car"]["Variant"]["UID"]
+
+
+def mmap_then_parse(car_file_paths):
+    for car_file_path in car_file_paths:
+        with CarFile.open(car_file_path) as car:
+            car.parse()
+            car.get_data()["Car"]["Variant"]["UID"]
+
+
+def mmap_lazy_lookup(car_file_paths):
+    for _ in get_values(car_file_paths, [UID_PATH]):
+        pass
+
+
+modes = {"read-then-parse": read_then_parse,
+         "mmap-then-parse": mmap_then_parse,
+         "mmap-lazy-lookup": mmap_lazy_lookup}
+
+
+def run_mode(mode, car_file_paths):
+    rss_before = get_peak_rss()
+    start = time.perf_counter()
+    modes[mode](car_file_paths)
+    elapsed = time.perf_counter() - start
+    rss_after = get_peak_rss()
+    return {"mode": mode,
+            "files": len(car_file_paths),
+            "seconds": elapsed,
+            "peak-rss-bytes": rss_after,
+            "peak-rss-increase-bytes": None if rss_before is None else rss_after - rss_before}
+
+
+def compare_loading(car_file_paths):
+    """
+    Run each loading strategy over car_file_paths in a fresh process so the peak RSS of one strategy
+    doesn't hide the cost of the next
+    """
+    results = list()
+    for mode in modes:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+            results.append(executor.submit(run_mode, mode, car_file_paths).result())
+    return results
+
+
+# name -> the arguments to generate_car_file for each of the synthetic files the benchmark suite runs against
+CORPUS = {"small": dict(depth=2, attributes_per_section=10, sections_per_section=3),
+          "wide": dict(depth=1, attributes_per_section=20000, sections_per_section=2),
+          "deep": dict(depth=7, attributes_per_section=5, sections_per_section=3),
+          "text-heavy": dict(depth=3, attributes_per_section=50, sections_per_section=4, text_size=256),
+          "blob-heavy": dict(depth=3, attributes_per_section=20, sections_per_section=4, blob_size=4096)}
+
+
+def generate_car_file(depth=3, attributes_per_section=20, sections_per_section=3, text_size=16, blob_size=0,
+                      key_blob_size=0, seed=0):
+    """
+    Build a synthetic .car file using the same tags and layout as the files Automation exports. Every
+    section holds a mix of number, text and boolean attributes; odd numbered child sections are stored as
+    embedded blobs the way some sections of real files are
+
+    Args:
+        depth: how many levels of sections to nest under the root
+        attributes_per_section: the number of attributes in each section
+        sections_per_section: the number of child sections in each section above the deepest level
+        text_size: the length of each text value
+        blob_size: if non-zero every section also gets a binary (non utf-8) text value of this length
+        key_blob_size: if non-zero the key of the first attribute of every section is preceded by a blob of
+                       this length the way some keys of real files are
+        seed: the seed for the random values so the same arguments always produce the same file
+
+    Returns:
+        the file contents as bytes
+    """
+    rng = random.Random(seed)
+    out = bytearray([BLOB_MARK, 4])
+    _generate_section_body(out, rng, depth, attributes_per_section, sections_per_section, text_size, blob_size,
+                           key_blob_size)
+    return bytes(out)
+
+
+def _generate_key(out, name, prefix=b""):
+    encoded_name = name.encode("utf-8")
+    out.append(TEXT)
+    if prefix:
+        out += LENGTH.pack(len(prefix))
+        out += prefix
+    out += LENGTH.pack(len(encoded_name))
+    out += encoded_name
+
+
+def _generate_text(out, value):
+    out.append(TEXT)
+    out += LENGTH.pack(len(value))
+    out += value
+
+
+def _generate_section_body(out, rng, depth, attributes_per_section, sections_per_section, text_size, blob_size,
+                           key_blob_size):
+    num_sections = sections_per_section if depth > 0 else 0
+    num_children = attributes_per_section + num_sections + (1 if blob_size else 0)
+    out += SECTION_HEADER.pack(0, num_children)
+    for idx in range(attributes_per_section):
+        prefix = b""
+        if idx == 0 and key_blob_size:
+            prefix = bytes([BLOB_MARK]) + bytes(rng.getrandbits(8) for _ in range(key_blob_size - 1))
+        _generate_key(out, f"Attribute{idx}", prefix)
+        kind = idx % 4
+        if kind == 0 or kind == 1:
+            out.append(NUMBER)
+            out += DOUBLE.pack(rng.uniform(-10000, 10000))
+        elif kind == 2:
+            _generate_text(out, "".join(rng.choice("ABCDEF0123456789") for _ in range(text_size)).encode("utf-8"))
+        else:
+            out.append(TRUE if rng.random() > 0.5 else FALSE)
+    if blob_size:
+        _generate_key(out, "Blob")
+        _generate_text(out, bytes([0xFF]) + bytes(rng.getrandbits(8) for _ in range(blob_size - 1)))
+    for idx in range(num_sections):
+        _generate_key(out, f"Section{idx}")
+        if idx % 2:
+            blob = bytearray([BLOB_MARK, 4])
+            _generate_section_body(blob, rng, depth - 1, attributes_per_section, sections_per_section,
+                                   text_size, blob_size, key_blob_size)
+            _generate_text(out, blob)
+        else:
+            out.append(ATTRIBUTE_SECTION)
+            _generate_section_body(out, rng, depth - 1, attributes_per_section, sections_per_section,
+                                   text_size, blob_size, key_blob_size)
+
+
+def _time_best_of(func, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_car_file(name, car_bytes, repeats=5):
+    """
+    Time parse(), get_data() and write_toml() over car_bytes taking the best of repeats runs, and measure
+    the peak memory allocated while parsing and building the data
+    """
+    size_mb = len(car_bytes) / 1000000
+
+    def parse():
+        CarFile(name, car_bytes).parse()
+
+    parsed = CarFile(name, car_bytes)
+    parsed.parse()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        toml_path = os.path.join(tmp_dir, "out.toml")
+        timings = {"parse": _time_best_of(parse, repeats),
+                   "get_data": _time_best_of(parsed.get_data, repeats),
+                   "write_toml": _time_best_of(lambda: parsed.write_toml(toml_path), max(1, repeats // 2))}
+
+    tracemalloc.start()
+    car = CarFile(name, car_bytes)
+    car.parse()
+    car.get_data()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {"name": name, "size-bytes": len(car_bytes), "peak-memory-bytes": peak_bytes}
+    for stage, seconds in timings.items():
+        result[f"{stage}-seconds"] = seconds
+        result[f"{stage}-mb-per-second"] = size_mb / seconds if seconds else None
+    return result
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(corpus_names=None, repeats=5):
+    results = list()
+    for name in (corpus_names or CORPUS.keys()):
+        results.append(benchmark_car_file(name, generate_car_file(**CORPUS[name]), repeats))
+    return {"commit": get_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "results": results}
+
+
+def compare_suites(baseline, current):
+    """
+    Returns:
+        a list of (corpus name, stage, baseline seconds, current seconds, current / baseline)
+    """
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    comparison = list()
+    for result in current["results"]:
+        if result["name"] not in baseline_results:
+            continue
+        for stage in ["parse", "get_data", "write_toml"]:
+            before = baseline_results[result["name"]][f"{stage}-seconds"]
+            after = result[f"{stage}-seconds"]
+            comparison.append((result["name"], stage, before, after, after / before if before else None))
+    return comparison
+
+
+def find_car_files(paths):
+    car_file_paths = list()
+    for path in paths:
+        if os.path.isdir(path):
+            car_file_paths.extend(glob.glob(os.path.join(path, "**", "*.car"), recursive=True))
+        else:
+            car_file_paths.append(path)
+    return car_file_paths
+
+
+def print_loading_comparison(args):
+    car_file_paths = find_car_files(args.paths)
+    if not car_file_paths:
+        print(f"No .car files found in {', '.join(args.paths)}")
+        return 1
+    print(f"{'mode':<20}{'seconds':>12}{'peak RSS (MiB)':>18}{'RSS increase (MiB)':>22}")
+    for result in compare_loading(car_file_paths):
+        peak = result["peak-rss-bytes"]
+        increase = result["peak-rss-increase-bytes"]
+        print(f"{result['mode']:<20}{result['seconds']:>12.4f}"
+              f"{'n/a' if peak is None else f'{peak / 1048576:.1f}':>18}"
+              f"{'n/a' if increase is None else f'{increase / 1048576:.1f}':>22}")
+    return 0
+
+
+def generate(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name in (args.corpus or CORPUS.keys()):
+        path = os.path.join(args.output_dir, f"{name}.car")
+        with open(path, "wb") as f:
+            f.write(generate_car_file(**CORPUS[name]))
+        print(f"Wrote {path}")
+    return 0
+
+
+def run(args):
+    suite = run_suite(args.corpus, args.repeats)
+    print(f"{'corpus':<14}{'size (MB)':>10}{'parse MB/s':>12}{'get_data MB/s':>15}{'write_toml MB/s':>17}"
+          f"{'peak (MiB)':>12}")
+    for result in suite["results"]:
+        print(f"{result['name']:<14}{result['size-bytes'] / 1000000:>10.2f}{result['parse-mb-per-second']:>12.2f}"
+              f"{result['get_data-mb-per-second']:>15.2f}{result['write_toml-mb-per-second']:>17.2f}"
+              f"{result['peak-memory-bytes'] / 1048576:>12.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(suite, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(json.load(f), suite)
+    return 0
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    print_comparison(baseline, current)
+    return 0
+
+
+def print_comparison(baseline, current):
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    print(f"{'corpus':<14}{'stage':<12}{'before (s)':>12}{'after (s)':>12}{'ratio':>8}")
+    for name, stage, before, after, ratio in compare_suites(baseline, current):
+        print(f"{name:<14}{stage:<12}{before:>12.4f}{after:>12.4f}"
+              f"{'n/a' if ratio is None else f'{ratio:.2f}':>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the Automation .car file decoder")
+    subparsers = parser.add_subparsers(title='Commands')
+    parser_run = subparsers.add_parser("run", help="Time the decoder against the synthetic corpus")
+    parser_run.add_argument("-c", "--corpus", choices=CORPUS.keys(), action="append",
+                            help="Only run this corpus entry; can be given multiple times")
+    parser_run.add_argument("-r", "--repeats", type=int, default=5, help="Take the best of this many runs")
+    parser_run.add_argument("-o", "--output", help="Write the results to this JSON file")
+    parser_run.add_argument("-b", "--baseline", help="Compare the results with this earlier JSON results file")
+    parser_run.set_defaults(func=run)
+    parser_compare = subparsers.add_parser("compare", help="Compare two JSON results files")
+    parser_compare.add_argument("baseline")
+    parser_compare.add_argument("current")
+    parser_compare.set_defaults(func=compare)
+    parser_generate = subparsers.add_parser("generate", help="Write the synthetic corpus out as .car files")
+    parser_generate.add_argument("output_dir")
+    parser_generate.add_argument("-c", "--corpus", choices=CORPUS.keys(), action="append",
+                                 help="Only write this corpus entry; can be given multiple times")
+    parser_generate.set_defaults(func=generate)
+    parser_loading = subparsers.add_parser("loading", help="Compare the ways of loading real .car files")
+    parser_loading.add_argument("paths", nargs="+", help=".car files or directories to search for .car files")
+    parser_loading.set_defaults(func=print_loading_comparison)
+    args = parser.parse_args()
+    if not hasattr(args, "func"):
+        parser.print_help()
+        return 2
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import time
+import atexit
+import pickle
+import hashlib
+
+import sim_racing_tools.constants as constants
+import sim_racing_tools.utils as utils
+from sim_racing_tools.automation.car_file_decoder import CarFile
+
+# Bump this whenever the output of CarFile.get_data() changes so stale entries are thrown away
+CACHE_VERSION = 1
+DEFAULT_MAX_SIZE_BYTES = 256 * 1024 * 1024
+INDEX_FILENAME = "index.pickle"
+ENTRY_EXTENSION = ".pickle"
+
+# Caches with an unsaved index; these are kept alive until they are flushed, at the latest when the
+# interpreter exits
+_unsaved_caches = set()
+
+
+@atexit.register
+def _flush_unsaved_caches():
+    for cache in list(_unsaved_caches):
+        cache.flush()
+
+
+def get_default_cache_dir():
+    return os.path.join(constants.get_cache_path(), "car-files")
+
+
+def hash_file(path):
+    content_hash = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+class CarFileCache(object):
+    """
+    An on-disk cache of CarFile.get_data() results stored as pickles.
+
+    Files are identified by their absolute path, size and modification time; that identity maps to a hash
+    of the file contents which is what the decoded data is stored under. A file that has been touched or
+    moved is re-hashed rather than re-decoded and identical exports share one entry. The total size of the
+    entries is bounded and the least recently used are evicted first. Entries are written as they are decoded
+    but the index of them is only written by flush(), close() or when the interpreter exits
+    """
+    def __init__(self, cache_dir=None, max_size_bytes=DEFAULT_MAX_SIZE_BYTES):
+        self.cache_dir = get_default_cache_dir() if cache_dir is None else cache_dir
+        self.max_size_bytes = max_size_bytes
+        # absolute path -> (size, mtime_ns, content hash)
+        self.files = dict()
+        # content hash -> [entry size in bytes, last used timestamp]
+        self.entries = dict()
+        self.unsaved = False
+        self._load_index()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILENAME)
+
+    @property
+    def size_bytes(self):
+        return sum(entry[0] for entry in self.entries.values())
+
+    def get_data(self, car_file_path):
+        """
+        Get the decoded contents of the .car file at car_file_path, decoding and storing it on a cache miss
+
+        Returns:
+            the same OrderedDict CarFile.get_data() would produce
+        """
+        abs_path = os.path.abspath(car_file_path)
+        stat = os.stat(abs_path)
+        identity = (stat.st_size, stat.st_mtime_ns)
+        known_file = self.files.get(abs_path)
+        if known_file is not None and known_file[:2] == identity:
+            content_hash = known_file[2]
+        else:
+            content_hash = hash_file(abs_path)
+            self.files[abs_path] = identity + (content_hash,)
+
+        data = self._load_entry(content_hash)
+        if data is None:
+            with CarFile.open(abs_path) as car:
+                car.parse()
+                data = car.get_data()
+            self._store_entry(content_hash, data)
+        self.entries[content_hash][1] = time.time()
+        self.unsaved = True
+        _unsaved_caches.add(self)
+        data["car-file-path"] = os.path.basename(car_file_path)
+        return data
+
+    def summary(self):
+        """
+        Returns:
+            a list of (path, content hash, entry size in bytes, last used timestamp) for every cached file
+        """
+        lines = list()
+        for path, (_, _, content_hash) in sorted(self.files.items()):
+            if content_hash in self.entries:
+                entry_size, last_used = self.entries[content_hash]
+                lines.append((path, content_hash, entry_size, last_used))
+        return lines
+
+    def flush(self):
+        """
+        Write the index if it has changed since it was last written
+        """
+        if self.unsaved:
+            self._save_index()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def clear(self):
+        for content_hash in list(self.entries.keys()):
+            self._remove_entry(content_hash)
+        self.files.clear()
+        self._save_index()
+
+    def _entry_path(self, content_hash):
+        return os.path.join(self.cache_dir, content_hash + ENTRY_EXTENSION)
+
+    def _load_entry(self, content_hash):
+        if content_hash not in self.entries:
+            return None
+        try:
+            with open(self._entry_path(content_hash), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self._remove_entry(content_hash)
+            return None
+
+    def _store_entry(self, content_hash, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_path = self._entry_path(content_hash)
+        with utils.atomic_write(entry_path) as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.entries[content_hash] = [os.path.getsize(entry_path), time.time()]
+        self._evict(keep=content_hash)
+
+    def _remove_entry(self, content_hash):
+        self.entries.pop(content_hash, None)
+        try:
+            os.remove(self._entry_path(content_hash))
+        except FileNotFoundError:
+            pass
+        for path in [p for p, info in self.files.items() if info[2] == content_hash]:
+            del self.files[path]
+
+    def _evict(self, keep=None):
+        total_size = self.size_bytes
+        for content_hash, (entry_size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            if total_size <= self.max_size_bytes:
+                break
+            if content_hash == keep:
+                continue
+            self._remove_entry(content_hash)
+            total_size -= entry_size
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                index = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+        if index.get("version") != CACHE_VERSION:
+            # Written by a different version of the decoder so none of the entries can be trusted
+            self.entries = index.get("entries", dict())
+            self.clear()
+            return
+        self.files = index["files"]
+        self.entries = index["entries"]
+
+    def _save_index(self):
+        self.unsaved = False
+        _unsaved_caches.discard(self)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index = {"version": CACHE_VERSION, "files": self.files, "entries": self.entries}
+        with utils.atomic_write(self.index_path) as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
@@ -19,12 +19,17 @@ You should have received a copy of the GNU General Public License
 along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
 """
 
+import os
 import sys
+import mmap
 import struct
 import toml
 import logging
 
-from collections import OrderedDict
+import sim_racing_tools.utils as utils
+import sim_racing_tools.curves as curves
+
+from collections import OrderedDict, namedtuple
 
 from typing import List
 
@@ -39,6 +44,26 @@ NUMBER = 78
 TEXT = 83
 # This tag denote other attributes live inside this one
 ATTRIBUTE_SECTION = 84
+# Sections can also be stored as a blob inside a TEXT value; these are given BLOB_MARK as their object type
+SECTION_TYPES = (ATTRIBUTE_SECTION, BLOB_MARK)
+
+# Pre-compiled layouts of the fixed width fields; these are read with unpack_from directly out of the
+# file's memoryview so no intermediate bytes objects are created
+LENGTH = struct.Struct("<I")
+DOUBLE = struct.Struct("<d")
+SECTION_HEADER = struct.Struct("<II")
+
+# The kinds of event produced by CarFile.iter_events
+ENTER_SECTION_EVENT = "enter_section"
+ATTRIBUTE_EVENT = "attribute"
+EXIT_SECTION_EVENT = "exit_section"
+
+# kind: one of the event kinds above
+# path: the full path of the item e.g. "Car/Variant/UID"
+# object_type: the type tag of the item
+# value: the decoded value of attributes, None for sections
+# start, end: the byte offsets in the file covered by the event
+CarEvent = namedtuple("CarEvent", ["kind", "path", "name", "object_type", "value", "start", "end"])
 
 
 def type_byte_to_string(byte):
@@ -52,29 +77,47 @@ def type_byte_to_string(byte):
 
 
 class ByteChunk(object):
-    def __init__(self, byte_stream):
-        self.byte_stream = byte_stream
+    """
+    A region of the .car file. Only the offsets of the region within the source buffer are stored; the
+    byte_stream property hands out a memoryview of it on demand so a chunk never copies the underlying bytes.
+    All of the nodes of the decoded tree use __slots__ to keep a fully parsed file close to the size of
+    the data it holds
+    """
+    __slots__ = ("source", "start", "end")
+
+    def __init__(self, source, start=0, end=None):
+        self.source = source
+        self.start = start
+        self.end = len(source) if end is None else end
 
     def hex(self):
         return " ".join(f'{b:02X}' for b in self.byte_stream)
 
+    @property
+    def byte_stream(self):
+        return memoryview(self.source)[self.start:self.end]
+
     @property
     def bytes(self):
         return self.byte_stream
 
     @property
     def length(self):
-        return len(self.byte_stream)
+        return self.end - self.start
 
 
 class AttributeSection(ByteChunk):
-    def __init__(self, name, byte_stream):
-        super(AttributeSection, self).__init__(byte_stream)
+    __slots__ = ("name", "key_type", "key_prefix", "object_type", "num_children", "attribute_list",
+                 "section_list", "section_stack")
+
+    def __init__(self, name, source, start=0, end=None, key_type=TEXT, object_type=ATTRIBUTE_SECTION,
+                 key_prefix=None):
+        super(AttributeSection, self).__init__(source, start, end)
         self.name = name
-        if struct.unpack("<I", bytearray(byte_stream[0:4]))[0] > 0:
-            self.num_children = struct.unpack("<LL", bytearray(byte_stream[0:8]))[0]
-        else:
-            self.num_children = struct.unpack("<I", bytearray(byte_stream[4:8]))[0]
+        self.key_type = key_type
+        self.key_prefix = key_prefix
+        self.object_type = object_type
+        self.num_children = section_child_count(source, start)
         self.attribute_list = list()
         self.section_list = list()
         self.section_stack = list()
@@ -119,14 +162,32 @@ class AttributeSection(ByteChunk):
             return False
         return self.num_children == (len(self.attribute_list) + len(self.section_list))
 
+    def children(self):
+        """
+        Returns:
+            the attributes and sections of this section in the order they are stored in the file
+        """
+        return sorted(self.attribute_list + self.section_list, key=file_order)
+
+    def release_parse_state(self):
+        """
+        Swap the growable lists used while parsing for tuples once the section is complete; nothing more
+        can be added to the section after this
+        """
+        self.attribute_list = tuple(self.attribute_list)
+        self.section_list = tuple(self.section_list)
+        self.section_stack = ()
+
     def _check_for_complete_sections(self):
         while len(self.section_stack) and self.section_stack[-1].complete():
-            self.section_stack.pop()
+            self.section_stack.pop().release_parse_state()
 
 
 class Blob(ByteChunk):
-    def __init__(self, name, byte_stream):
-        super(Blob, self).__init__(byte_stream)
+    __slots__ = ("name", "attributes", "sections", "section_stack")
+
+    def __init__(self, name, source, start=0, end=None):
+        super(Blob, self).__init__(source, start, end)
         self.name = name
         self.attributes = list()
         self.sections = list()
@@ -134,36 +195,49 @@ class Blob(ByteChunk):
 
 
 class Text(ByteChunk):
-    def __init__(self, byte_stream):
-        super(Text, self).__init__(byte_stream)
+    __slots__ = ()
+
+    def __init__(self, source, start=0, end=None):
+        super(Text, self).__init__(source, start, end)
 
     def __str__(self):
         try:
-            return self.byte_stream.decode("utf-8")
-        except (AttributeError, ValueError):
+            return str(self.byte_stream, "utf-8")
+        except (TypeError, ValueError):
             return self.hex()
 
     @property
     def value(self):
         return self.__str__()
 
+    @classmethod
+    def from_value(cls, value):
+        return cls(value.encode("utf-8"))
+
 
 class Number(ByteChunk):
-    def __init__(self, byte_stream):
-        super(Number, self).__init__(byte_stream)
-        self._value = struct.unpack("d", bytearray(self.byte_stream))[0]
+    __slots__ = ()
+
+    def __init__(self, source, start=0, end=None):
+        super(Number, self).__init__(source, start, end)
 
     def __str__(self):
-        return str(self._value)
+        return str(self.value)
 
     @property
     def value(self):
-        return self._value
+        return DOUBLE.unpack_from(self.source, self.start)[0]
+
+    @classmethod
+    def from_value(cls, value):
+        return cls(DOUBLE.pack(value))
 
 
 class FalseType(ByteChunk):
-    def __init__(self, byte_stream):
-        super(FalseType, self).__init__(byte_stream)
+    __slots__ = ()
+
+    def __init__(self, source, start=0, end=None):
+        super(FalseType, self).__init__(source, start, end)
 
     def __str__(self):
         return str(False)
@@ -174,8 +248,10 @@ class FalseType(ByteChunk):
 
 
 class TrueType(ByteChunk):
-    def __init__(self, byte_stream):
-        super(TrueType, self).__init__(byte_stream)
+    __slots__ = ()
+
+    def __init__(self, source, start=0, end=None):
+        super(TrueType, self).__init__(source, start, end)
 
     def __str__(self):
         return str(True)
@@ -185,10 +261,22 @@ class TrueType(ByteChunk):
         return True
 
 
+value_type_map = {NUMBER: Number, TEXT: Text}
+# Booleans carry no data so every attribute shares the same value object
+shared_values = {FALSE: FalseType(b""), TRUE: TrueType(b"")}
+
+
 class CarAttribute(object):
+    __slots__ = ("name", "value_object", "key_type", "key_prefix", "offset")
+
     def __init__(self):
         self.name = None
         self.value_object = None
+        self.key_type = TEXT
+        # The blobs stored in front of some text keys; copied back in front of the name when re-encoding
+        self.key_prefix = None
+        # Where the value was stored in the file; keeps the original ordering when the file is re-encoded
+        self.offset = 0
 
     def __str__(self):
         return f'{self.name} = {str(self.value_object)}'
@@ -197,6 +285,15 @@ class CarAttribute(object):
     def value(self):
         return self.value_object.value
 
+    @value.setter
+    def value(self, value):
+        if isinstance(value, bool):
+            self.value_object = shared_values[TRUE if value else FALSE]
+        elif isinstance(value, (int, float)):
+            self.value_object = Number.from_value(value)
+        else:
+            self.value_object = Text.from_value(str(value))
+
 
 class CarFile(object):
     def __init__(self, filename, byte_stream):
@@ -204,15 +301,62 @@ class CarFile(object):
         sections: List[AttributeSection]
 
         self.car_file_path = filename
-        self.byte_stream = byte_stream
+        self.byte_stream = memoryview(byte_stream)
+        self._mapping = None
         self.current_pos = 0
         self.section_stack = list()
         self.sections = list()
         self.attributes = list()
+        # Both maps are keyed by the full path of the item e.g. "Car/Variant/UID"
+        # section path -> (offset of the first child, offset after the last descendant); filled in by index()
+        self.section_offset_map = dict()
+        # attribute path -> (value type, value start offset, value end offset); filled in a section at a time
+        # by the lookups that need them
         self.attribute_offset_map = dict()
+        # the sections whose attributes are in attribute_offset_map
+        self.indexed_sections = set()
         self._parse_opening_blob_mark("Car")
+        self.body_start = self.current_pos
         self.current_attribute = None
 
+    @classmethod
+    def open(cls, path, writable=False):
+        """
+        Memory-map the .car file at path and parse straight from the mapping so only the bytes that are
+        actually touched get read in. Call close() or use the returned object as a context manager to release
+        the mapping once finished with it
+
+        Args:
+            path: the .car file to open
+            writable: map the file for writing so patch_numbers() changes the file itself
+        """
+        with open(path, "r+b" if writable else "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        try:
+            car = cls(os.path.basename(path), mapping)
+        except Exception:
+            mapping.close()
+            raise
+        car._mapping = mapping
+        return car
+
+    def close(self):
+        self.byte_stream.release()
+        if self._mapping is not None:
+            self._mapping.flush()
+            try:
+                self._mapping.close()
+            except BufferError:
+                # Views handed out by ByteChunk.byte_stream are still alive; it is unmapped once they are collected
+                pass
+            self._mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def __str__(self):
         out = "\n\n".join([str(a) for a in self.attributes])
         for section in self.sections:
@@ -230,59 +374,314 @@ class CarFile(object):
             data_dict[section.name] = section.as_dict()
         return data_dict
 
+    def get(self, path, default=None):
+        """
+        Lazily look up a single item by its path without parsing the whole file e.g. car.get("Car/Variant/UID")
+        An index of the sections of the file is built on first use, then only the section holding the item is
+        searched and only the value or section that the path refers to is decoded; sections are returned as an
+        OrderedDict in the same form as get_data()
+
+        Args:
+            path: the names of the sections leading to the item and the item itself separated by "/"
+            default: the value returned if the path isn't present in the file
+
+        Returns:
+            the decoded value at path or default
+        """
+        self.index()
+        if path in self.section_offset_map:
+            return self._decode_section(path).as_dict()
+        section_path = path.rpartition("/")[0]
+        if section_path in self.section_offset_map and section_path not in self.indexed_sections:
+            self._index_attributes(section_path)
+        if path in self.attribute_offset_map:
+            object_type, start, end = self.attribute_offset_map[path]
+            return make_value(object_type, self.byte_stream, start, end).value
+        return default
+
+    def get_values(self, item_paths):
+        """
+        Look up several items in one pass over the file, stopping as soon as every requested attribute has
+        been found
+
+        Returns:
+            a dict of {item path: value} with None for any missing item
+        """
+        values = dict()
+        remaining = set(item_paths)
+        for event in self.iter_events(decode_values=False):
+            if event.kind == ATTRIBUTE_EVENT and event.path in remaining:
+                values[event.path] = make_value(event.object_type, self.byte_stream, event.start, event.end).value
+                remaining.discard(event.path)
+                if not remaining:
+                    break
+        # Sections and missing items fall back to a lookup through the index
+        for item_path in remaining:
+            values[item_path] = self.get(item_path)
+        return {item_path: values[item_path] for item_path in item_paths}
+
+    def index(self):
+        """
+        Skim over the file once and record where every section starts and ends by its path. Only the names of
+        sections are decoded during this pass; the map is only built the first time this is called
+        """
+        if self.section_offset_map:
+            return
+        root = self.sections[0]
+        stack = [[root.name, root.num_children, self.body_start]]
+        end = self.body_start
+        for name, _, object_type, start, end, _ in self._iter_entries(self.body_start, decode_names=False):
+            if stack:
+                stack[-1][1] -= 1
+            if object_type in SECTION_TYPES:
+                stack.append([f"{stack[-1][0]}/{name}" if stack else name,
+                              section_child_count(self.byte_stream, start), end])
+            while stack and stack[-1][1] <= 0:
+                section_path, _, section_start = stack.pop()
+                self.section_offset_map[section_path] = (section_start, end)
+        while stack:
+            section_path, _, section_start = stack.pop()
+            self.section_offset_map[section_path] = (section_start, len(self.byte_stream))
+
+    def iter_events(self, decode_values=True):
+        """
+        Stream the contents of the file as CarEvents without building a tree. Every section produces an
+        enter_section event spanning its header, the events for its children and then an exit_section event
+        spanning all of its children. Attribute events span the attribute value
+
+        Args:
+            decode_values: if False the value of each attribute event is left as None
+
+        Returns:
+            a generator of CarEvent
+        """
+        root = self.sections[0]
+        yield CarEvent(ENTER_SECTION_EVENT, root.name, root.name, ATTRIBUTE_SECTION, None, root.start, root.end)
+        stack = [[root.name, root.name, root.num_children, self.body_start]]
+        for name, _, object_type, start, end, _ in self._iter_entries(self.body_start):
+            if stack:
+                path = f"{stack[-1][0]}/{name}"
+                stack[-1][2] -= 1
+            else:
+                path = name
+            if object_type in SECTION_TYPES:
+                yield CarEvent(ENTER_SECTION_EVENT, path, name, object_type, None, start, end)
+                stack.append([path, name, section_child_count(self.byte_stream, start), end])
+            else:
+                value = make_value(object_type, self.byte_stream, start, end).value if decode_values else None
+                yield CarEvent(ATTRIBUTE_EVENT, path, name, object_type, value, start, end)
+            while stack and stack[-1][2] <= 0:
+                section_path, section_name, _, section_start = stack.pop()
+                yield CarEvent(EXIT_SECTION_EVENT, section_path, section_name, ATTRIBUTE_SECTION, None,
+                               section_start, end)
+        while stack:
+            section_path, section_name, _, section_start = stack.pop()
+            yield CarEvent(EXIT_SECTION_EVENT, section_path, section_name, ATTRIBUTE_SECTION, None,
+                           section_start, len(self.byte_stream))
+
     def write_toml(self, path):
         with open(path, "w+") as out_file:
             toml.dump(self.get_data(), out_file)
 
+    def encode(self):
+        """
+        Re-encode the parsed tree into the binary .car layout, parsing the file first if that hasn't been done.
+        Anything that hasn't been changed is copied as it was stored so an unmodified file encodes to the
+        bytes it was parsed from
+
+        Returns:
+            the encoded file as bytes
+        """
+        self.parse()
+        out = bytearray(self.byte_stream[0:self.sections[0].start])
+        encode_section_body(out, self.sections[0])
+        for item in sorted(self.attributes + self.sections[1:], key=file_order):
+            encode_item(out, item)
+        return bytes(out)
+
+    def write(self, path):
+        """
+        Write the re-encoded file to path, replacing it in one step.
+
+        If this was opened with CarFile.open() the mapping is closed once the file is encoded, as Windows won't
+        replace a file that is still mapped, so this CarFile can't be used afterwards. Writing back over the
+        opened file on Windows also needs every ByteChunk.byte_stream view of it to have been released
+        """
+        data = self.encode()
+        if self._mapping is not None:
+            self.close()
+        with utils.atomic_write(path) as out_file:
+            out_file.write(data)
+
+    def patch_numbers(self, new_values):
+        """
+        Overwrite Number attributes where they are stored without re-encoding the rest of the file. Each
+        number is a fixed 8 bytes so nothing else moves. The buffer has to be writable, e.g. a bytearray or a
+        file opened with CarFile.open(path, writable=True). Nothing is changed unless every path is found
+
+        Args:
+            new_values: {item path: the new value or a callable taking the current value and returning the new one}
+
+        Returns:
+            a dict of {item path: previous value}
+        Raises:
+            KeyError if a path isn't in the file, ValueError if a path isn't a Number
+        """
+        return self.patch_offsets(self.find_number_offsets(new_values), new_values)
+
+    def find_number_offsets(self, item_paths):
+        """
+        Returns:
+            a dict of {item path: offset of its value} for the Number attributes at item_paths
+        Raises:
+            KeyError if a path isn't in the file, ValueError if a path isn't a Number
+        """
+        offsets = dict()
+        remaining = set(item_paths)
+        for event in self.iter_events(decode_values=False):
+            if event.kind == ATTRIBUTE_EVENT and event.path in remaining:
+                if event.object_type != NUMBER:
+                    raise ValueError(f"{event.path} in {self.car_file_path} isn't a Number so can't be patched")
+                offsets[event.path] = event.start
+                remaining.discard(event.path)
+                if not remaining:
+                    break
+        if remaining:
+            raise KeyError(f"{', '.join(sorted(remaining))} not found in {self.car_file_path}")
+        return offsets
+
+    def patch_offsets(self, offsets, new_values):
+        """
+        Overwrite the Numbers at offsets found by find_number_offsets(). Every new value is worked out before
+        anything is written
+
+        Returns:
+            a dict of {item path: previous value}
+        """
+        old_values = dict()
+        patched_values = dict()
+        for path, offset in offsets.items():
+            old_values[path] = DOUBLE.unpack_from(self.byte_stream, offset)[0]
+            new_value = new_values[path]
+            patched_values[path] = new_value(old_values[path]) if callable(new_value) else new_value
+        for path, offset in offsets.items():
+            DOUBLE.pack_into(self.byte_stream, offset, patched_values[path])
+        return old_values
+
     def parse(self):
-        parsing_attribute = False
-        parsing_int_pair = False
-        while True:
-            if self.current_pos >= len(self.byte_stream):
+        if self.current_pos >= len(self.byte_stream):
+            return
+        for name, key_type, object_type, start, end, key_prefix in self._iter_entries(self.body_start):
+            if object_type in SECTION_TYPES:
+                self._add_section(AttributeSection(name, self.byte_stream, start, end, key_type, object_type,
+                                                   key_prefix))
+            else:
+                self._add_attribute(make_attribute(name, key_type, object_type, self.byte_stream, start, end,
+                                                   key_prefix))
+            self._check_for_section_complete()
+        self.current_pos = len(self.byte_stream)
+        for section in self.section_stack:
+            section.release_parse_state()
+        self.section_stack = list()
+
+    def _index_attributes(self, section_path):
+        """
+        Record the offsets of the attributes of a section and of every section nested in it
+        """
+        start, end = self.section_offset_map[section_path]
+        stack = [[section_path, section_child_count(self.byte_stream, start - SECTION_HEADER.size)]]
+        for name, _, object_type, value_start, value_end, _ in self._iter_entries(start, end):
+            path = f"{stack[-1][0]}/{name}"
+            stack[-1][1] -= 1
+            if object_type in SECTION_TYPES:
+                stack.append([path, section_child_count(self.byte_stream, value_start)])
+            else:
+                self.attribute_offset_map[path] = (object_type, value_start, value_end)
+            while len(stack) > 1 and stack[-1][1] <= 0:
+                self.indexed_sections.add(stack.pop()[0])
+        self.indexed_sections.add(section_path)
+
+    def _decode_section(self, path):
+        start, end = self.section_offset_map[path]
+        section = AttributeSection(path.rsplit("/", 1)[-1], self.byte_stream, start - SECTION_HEADER.size, start)
+        for name, key_type, object_type, value_start, value_end, key_prefix in self._iter_entries(start, end):
+            if object_type in SECTION_TYPES:
+                section.add_section(AttributeSection(name, self.byte_stream, value_start, value_end,
+                                                     key_type, object_type, key_prefix))
+            else:
+                section.add_attribute(make_attribute(name, key_type, object_type,
+                                                     self.byte_stream, value_start, value_end, key_prefix))
+        section.release_parse_state()
+        return section
+
+    def _iter_entries(self, pos, end=None, decode_names=True):
+        """
+        Walk the entries stored between pos and end yielding
+        (name, key_type, object_type, value_start, value_end, key_prefix) for each one. The value of a section
+        only spans its header; its children are the entries that follow it. key_prefix is a ByteChunk of the
+        blobs stored in front of a text key's name or None if there aren't any. If decode_names is False only
+        the names of sections are decoded and the name of every attribute is None
+        """
+        byte_stream = self.byte_stream
+        end = len(byte_stream) if end is None else end
+        while pos < end:
+            key_type = byte_stream[pos]
+            pos += 1
+            if pos >= end:
                 break
-            if parsing_attribute or parsing_int_pair:
-                if not parsing_int_pair:
-                    length = self._parse_length()
-                    if self._is_blob():
+            key_prefix = None
+            if key_type == TEXT:
+                prefix_start = pos
+                length = LENGTH.unpack_from(byte_stream, pos)[0]
+                pos += LENGTH.size
+                while byte_stream[pos] == BLOB_MARK:
+                    if logging.getLogger().isEnabledFor(logging.DEBUG):
                         logging.debug("Skipped non-string:")
-                        logging.debug(" ".join(f'{b:02X}' for b in self.byte_stream[self.current_pos: self.current_pos + length]))
-                        self.current_pos += length
-                        continue
-                    attribute_name = self._parse_text(length)
-                else:
-                    attribute_name = str(self._parse_number())
-
-                object_type = self._parse_type()
-                if object_type == ATTRIBUTE_SECTION:
-                    self._add_section(self._parse_attribute_section(str(attribute_name)))
-                elif object_type == FALSE:
-                    self._add_attribute(str(attribute_name), FalseType(object_type))
-                elif object_type == TRUE:
-                    self._add_attribute(str(attribute_name), TrueType(object_type))
+                        logging.debug(ByteChunk(byte_stream, pos, pos + length).hex())
+                    pos += length
+                    if pos >= end:
+                        return
+                    key_prefix = ByteChunk(byte_stream, prefix_start, pos)
+                    length = LENGTH.unpack_from(byte_stream, pos)[0]
+                    pos += LENGTH.size
+                name_start = pos
+                pos += length
+            elif key_type == NUMBER:
+                name_start = pos
+                pos += DOUBLE.size
+            else:
+                continue
+
+            name_end = pos
+            object_type = byte_stream[pos]
+            pos += 1
+            if object_type == ATTRIBUTE_SECTION:
+                value_start, value_end = pos, pos + SECTION_HEADER.size
+            elif object_type == FALSE or object_type == TRUE:
+                value_start, value_end = pos, pos
+            elif object_type == NUMBER:
+                value_start, value_end = pos, pos + DOUBLE.size
+            else:
+                length = LENGTH.unpack_from(byte_stream, pos)[0]
+                pos += LENGTH.size
+                if byte_stream[pos] == BLOB_MARK:
+                    object_type = BLOB_MARK
+                    value_start, value_end = pos + 2, pos + 2 + SECTION_HEADER.size
                 else:
-                    if object_type == NUMBER:
-                        self._add_attribute(str(attribute_name), self._parse_number())
-                    else:
-                        length = self._parse_length()
-                        if self._is_blob():
-                            self.current_pos += 2
-                            self._add_section(self._parse_attribute_section(str(attribute_name)))
-                        else:
-                            self._add_attribute(str(attribute_name), self._parse_text(length))
-
-                self._check_for_section_complete()
-                parsing_attribute = False
-                parsing_int_pair = False
+                    object_type = TEXT
+                    value_start, value_end = pos, pos + length
+            if not decode_names and object_type not in SECTION_TYPES:
+                name = None
+            elif key_type == TEXT:
+                name = sys.intern(str(Text(byte_stream, name_start, name_end)))
             else:
-                type_byte = self._parse_type()
-                if type_byte == TEXT:
-                    parsing_attribute = True
-                elif type_byte == NUMBER:
-                    parsing_int_pair = True
+                name = sys.intern(str(DOUBLE.unpack_from(byte_stream, name_start)[0]))
+            yield name, key_type, object_type, value_start, value_end, key_prefix
+            pos = value_end
 
     def _check_for_section_complete(self):
         while len(self.section_stack) and self.section_stack[-1].complete():
-            self.section_stack.pop()
+            self.section_stack.pop().release_parse_state()
 
     def _add_section(self, section):
         if len(self.section_stack):
@@ -291,51 +690,17 @@ class CarFile(object):
             self.section_stack.append(section)
             self.sections.append(self.section_stack[-1])
 
-    def _add_attribute(self, name, value):
-        attribute = CarAttribute()
-        attribute.name = name
-        attribute.value_object = value
-
+    def _add_attribute(self, attribute):
         if len(self.section_stack):
             self.section_stack[-1].add_attribute(attribute)
         else:
             self.attributes.append(attribute)
-        self.attribute_offset_map[attribute.name] = self.current_pos
-
-    def _is_blob(self):
-        if self.byte_stream[self.current_pos] == 1:
-            return True
-        return False
-
-    def _parse_string_length(self):
-        try:
-            return struct.unpack("<I", bytearray(self.byte_stream[self.current_pos:self.current_pos + 4]))[0]
-        finally:
-            self.current_pos += 4
-
-    def _parse_text(self, length):
-        try:
-            return Text(self.byte_stream[self.current_pos:self.current_pos + length])
-        finally:
-            self.current_pos += length
-
-    def _parse_number(self):
-        try:
-            return Number(self.byte_stream[self.current_pos:self.current_pos + 8])
-        finally:
-            self.current_pos += 8
 
     def _parse_attribute_section(self, name):
         try:
-            return AttributeSection(name, self.byte_stream[self.current_pos:self.current_pos + 8])
-        finally:
-            self.current_pos += 8
-
-    def _parse_type(self):
-        try:
-            return self.byte_stream[self.current_pos]
+            return AttributeSection(name, self.byte_stream, self.current_pos, self.current_pos + SECTION_HEADER.size)
         finally:
-            self.current_pos += 1
+            self.current_pos += SECTION_HEADER.size
 
     def _parse_opening_blob_mark(self, opening_section_name):
         if self.byte_stream[self.current_pos] != BLOB_MARK:
@@ -344,23 +709,181 @@ class CarFile(object):
         self.section_stack.append(self._parse_attribute_section(opening_section_name))
         self.sections.append(self.section_stack[-1])
 
-    def _parse_length(self):
-        try:
-            return struct.unpack("<I", bytearray(self.byte_stream[self.current_pos:self.current_pos + 4]))[0]
-        finally:
-            self.current_pos += 4
+
+def iter_car_events(byte_stream, decode_values=True):
+    """
+    Stream the contents of a .car file held in byte_stream as CarEvents in constant memory. Stop consuming
+    the generator as soon as enough has been seen; nothing after that point is read
+
+    e.g. to collect every attribute of the variant section:
+    for event in iter_car_events(data):
+        if event.kind == ATTRIBUTE_EVENT and event.path.startswith("Car/Variant/"):
+            ...
+    """
+    return CarFile(None, byte_stream).iter_events(decode_values)
+
+
+def get_values(car_file_paths, item_paths):
+    """
+    Fetch the values at item_paths from each of car_file_paths, memory-mapping each file and only decoding
+    the requested items
+
+    Args:
+        car_file_paths: an iterable of paths to .car files
+        item_paths: the paths of the items to fetch e.g. ["Car/Variant/UID"]
+
+    Returns:
+        a generator of (car file path, {item path: value}) with None for any missing item
+    """
+    for car_file_path in car_file_paths:
+        with CarFile.open(car_file_path) as car:
+            yield car_file_path, car.get_values(item_paths)
+
+
+def section_child_count(byte_stream, offset=0):
+    first_count, second_count = SECTION_HEADER.unpack_from(byte_stream, offset)
+    return first_count if first_count > 0 else second_count
+
+
+def patch_car_files(car_file_paths, new_values):
+    """
+    Apply CarFile.patch_numbers() to each of car_file_paths in place. Every path is found in every file before
+    any file is written so a file that is missing one leaves the whole batch untouched. If writing a file
+    fails the files already patched are put back before the error is raised
+
+    e.g. to raise a value by 10% across a set of cars:
+    patch_car_files(paths, {"Car/Variant/SomeValue": lambda v: v * 1.1})
+
+    Returns:
+        a dict of {car file path: {item path: previous value}}
+    Raises:
+        KeyError if a path isn't in one of the files, ValueError if a path isn't a Number in one of them
+    """
+    offsets = dict()
+    for car_file_path in car_file_paths:
+        with CarFile.open(car_file_path) as car:
+            offsets[car_file_path] = car.find_number_offsets(new_values)
+
+    old_values = dict()
+    try:
+        for car_file_path, file_offsets in offsets.items():
+            with CarFile.open(car_file_path, writable=True) as car:
+                old_values[car_file_path] = car.patch_offsets(file_offsets, new_values)
+    except BaseException:
+        for car_file_path, file_old_values in old_values.items():
+            with CarFile.open(car_file_path, writable=True) as car:
+                car.patch_offsets(offsets[car_file_path], file_old_values)
+        raise
+    return old_values
+
+
+def encode_key(out, name, key_type, key_prefix=None):
+    if key_type == NUMBER:
+        out.append(NUMBER)
+        out += DOUBLE.pack(float(name))
+    else:
+        encoded_name = name.encode("utf-8")
+        out.append(TEXT)
+        if key_prefix is not None:
+            out += key_prefix.byte_stream
+        out += LENGTH.pack(len(encoded_name))
+        out += encoded_name
+
+
+def encode_item(out, item):
+    encode_key(out, item.name, item.key_type, item.key_prefix)
+    if isinstance(item, AttributeSection):
+        if item.object_type == BLOB_MARK:
+            # The blob mark and the byte after it sit directly in front of the section header
+            blob = bytearray(memoryview(item.source)[item.start - 2:item.start])
+            encode_section_body(blob, item)
+            out.append(TEXT)
+            out += LENGTH.pack(len(blob))
+            out += blob
+        else:
+            out.append(ATTRIBUTE_SECTION)
+            encode_section_body(out, item)
+        return
+
+    value = item.value_object
+    if isinstance(value, TrueType):
+        out.append(TRUE)
+    elif isinstance(value, FalseType):
+        out.append(FALSE)
+    elif isinstance(value, Number):
+        out.append(NUMBER)
+        out += value.byte_stream
+    else:
+        out.append(TEXT)
+        out += LENGTH.pack(value.length)
+        out += value.byte_stream
+
+
+def encode_section_body(out, section):
+    children = section.children()
+    if len(children) == section.num_children:
+        out += section.byte_stream
+    else:
+        first_count, second_count = SECTION_HEADER.unpack_from(section.source, section.start)
+        if first_count > 0:
+            out += SECTION_HEADER.pack(len(children), second_count)
+        else:
+            out += SECTION_HEADER.pack(first_count, len(children))
+    for child in children:
+        encode_item(out, child)
+
+
+def make_attribute(name, key_type, object_type, byte_stream, start, end, key_prefix=None):
+    attribute = CarAttribute()
+    attribute.name = name
+    attribute.key_type = key_type
+    attribute.key_prefix = key_prefix
+    attribute.offset = start
+    attribute.value_object = make_value(object_type, byte_stream, start, end)
+    return attribute
+
+
+def file_order(item):
+    return item.offset if isinstance(item, CarAttribute) else item.start
+
+
+def make_value(object_type, byte_stream, start, end):
+    if object_type in shared_values:
+        return shared_values[object_type]
+    return value_type_map[object_type](byte_stream, start, end)
 
 
 def hp_lut_calculator(torque_lut):
-    # hp = T x RPM/5,252
-    out_lut = OrderedDict()
-    for rpm, T in torque_lut:
-        out_lut[rpm] = T * rpm/5252
+    """
+    Args:
+        torque_lut: an iterable of (rpm, torque in lb-ft) pairs
+
+    Returns:
+        an OrderedDict of rpm -> hp
+    """
+    pairs = list(torque_lut)
+    rpm_points, torque = zip(*pairs) if pairs else ((), ())
+    return OrderedDict(zip(rpm_points, curves.torque_to_hp(torque, rpm_points).tolist()))
+
+
+def main():
+    import argparse
+    import sim_racing_tools.automation.car_file_export as car_file_export
+    parser = argparse.ArgumentParser(description="Decode an Automation .car file")
+    parser.add_argument("car_file", help="The .car file to decode")
+    parser.add_argument("-f", "--format", choices=["toml"] + list(car_file_export.exporters.keys()), default="toml",
+                        help="The format to write; everything other than toml is streamed out as the file is read")
+    parser.add_argument("-o", "--output", help="The file to write to. Defaults to out.<format>")
+    args = parser.parse_args()
+    with CarFile.open(args.car_file) as c:
+        if args.format == "toml":
+            c.parse()
+            c.write_toml(args.output or "out.toml")
+            return
+        exporter_class = car_file_export.exporters[args.format]
+        with exporter_class(args.output or f"out{exporter_class.extension}") as exporter:
+            car_file_export.export_car_file(c, exporter)
 
 
 if __name__ == '__main__':
-    with open(sys.argv[1], "rb") as f:
-        car_bytes = f.read()
-        c = CarFile(f.name, car_bytes)
-        c.parse()
-        c.write_toml("out.toml")
+    main()
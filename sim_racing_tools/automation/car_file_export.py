@@ -0,0 +1,165 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+
+from sim_racing_tools.automation.car_file_decoder import ATTRIBUTE_EVENT, TEXT, NUMBER, TRUE, FALSE
+
+# Every exporter writes one row per attribute:
+# file: the name of the .car file the attribute came from
+# path: the full path of the attribute e.g. "Car/Variant/UID"
+# type: one of the names below
+# value: the decoded value
+TYPE_NAMES = {TEXT: "text", NUMBER: "number", TRUE: "bool", FALSE: "bool"}
+DEFAULT_BATCH_SIZE = 65536
+
+
+class Exporter(object):
+    """
+    Base class of the streaming exporters. Rows are written as the file is walked so the decoded tree is
+    never built; several .car files can be exported into the same output
+    """
+    extension = None
+
+    def __init__(self, out_path):
+        self.out_path = out_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write_row(self, car_file_path, path, type_name, value):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class JsonLinesExporter(Exporter):
+    extension = ".jsonl"
+
+    def __init__(self, out_path):
+        super(JsonLinesExporter, self).__init__(out_path)
+        self.out_file = open(out_path, "w", encoding="utf-8")
+
+    def write_row(self, car_file_path, path, type_name, value):
+        self.out_file.write(json.dumps({"file": car_file_path, "path": path, "type": type_name, "value": value}))
+        self.out_file.write("\n")
+
+    def close(self):
+        self.out_file.close()
+
+
+class MsgpackExporter(Exporter):
+    """
+    Writes a stream of msgpack maps, one per row. Requires the msgpack package
+    """
+    extension = ".msgpack"
+
+    def __init__(self, out_path):
+        super(MsgpackExporter, self).__init__(out_path)
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError("The msgpack package is needed to export to msgpack: pip install msgpack")
+        self.packer = msgpack.Packer()
+        self.out_file = open(out_path, "wb")
+
+    def write_row(self, car_file_path, path, type_name, value):
+        self.out_file.write(self.packer.pack({"file": car_file_path, "path": path, "type": type_name, "value": value}))
+
+    def close(self):
+        self.out_file.close()
+
+
+class ArrowExporter(Exporter):
+    """
+    Writes a flattened columnar table with a row per attribute path as Arrow IPC. Values are split into a
+    number, text and bool column by type so every column has a single type. Rows are written out in record
+    batches of batch_size. Requires the pyarrow package
+    """
+    extension = ".arrow"
+
+    def __init__(self, out_path, batch_size=DEFAULT_BATCH_SIZE):
+        super(ArrowExporter, self).__init__(out_path)
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError(f"The pyarrow package is needed to export to {self.extension}: pip install pyarrow")
+        self.pa = pyarrow
+        self.schema = pyarrow.schema([("file", pyarrow.string()),
+                                      ("path", pyarrow.string()),
+                                      ("type", pyarrow.string()),
+                                      ("number", pyarrow.float64()),
+                                      ("text", pyarrow.string()),
+                                      ("bool", pyarrow.bool_())])
+        self.batch_size = batch_size
+        self.columns = {name: list() for name in self.schema.names}
+        self.writer = self._open_writer()
+
+    def _open_writer(self):
+        return self.pa.ipc.new_file(self.out_path, self.schema)
+
+    def write_row(self, car_file_path, path, type_name, value):
+        self.columns["file"].append(car_file_path)
+        self.columns["path"].append(path)
+        self.columns["type"].append(type_name)
+        self.columns["number"].append(value if type_name == "number" else None)
+        self.columns["text"].append(value if type_name == "text" else None)
+        self.columns["bool"].append(value if type_name == "bool" else None)
+        if len(self.columns["path"]) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.columns["path"]:
+            return
+        self.writer.write_table(self.pa.table(self.columns, schema=self.schema))
+        for column in self.columns.values():
+            column.clear()
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+class ParquetExporter(ArrowExporter):
+    extension = ".parquet"
+
+    def _open_writer(self):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self.out_path, self.schema)
+
+
+exporters = {"jsonl": JsonLinesExporter,
+             "msgpack": MsgpackExporter,
+             "arrow": ArrowExporter,
+             "parquet": ParquetExporter}
+
+
+def export_car_file(car_file, exporter):
+    """
+    Stream every attribute of car_file (a CarFile) into exporter
+    """
+    for event in car_file.iter_events():
+        if event.kind == ATTRIBUTE_EVENT:
+            exporter.write_row(car_file.car_file_path, event.path, TYPE_NAMES[event.object_type], event.value)
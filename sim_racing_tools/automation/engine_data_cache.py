@@ -0,0 +1,235 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import atexit
+import pickle
+import threading
+from collections import OrderedDict
+
+import sim_racing_tools.constants as constants
+import sim_racing_tools.utils as utils
+import sim_racing_tools.automation.sandbox as sandbox
+
+# Bump this whenever the output of sandbox.get_engine_data() changes so stale entries are thrown away
+CACHE_VERSION = 2
+DEFAULT_MAX_ENTRIES = 512
+CACHE_FILENAME = "engine-data.pickle"
+ENGINE_DATA = "data"
+ENGINE_RECORD = "record"
+ENGINE_UID = "uid"
+
+# Caches with unsaved entries; these are kept alive until they are flushed, at the latest when the interpreter
+# exits
+_unsaved_caches = set()
+
+
+@atexit.register
+def _flush_unsaved_caches():
+    for cache in list(_unsaved_caches):
+        cache.flush()
+
+
+def get_default_cache_dir():
+    return os.path.join(constants.get_cache_path(), "engine-data")
+
+
+def _stat_identity(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def get_db_identity(db_path):
+    """
+    Returns:
+        a value that changes whenever the sandbox database at db_path is written to. Automation may keep
+        the database in WAL mode so the write-ahead log is included as commits only reach the main file
+        when it is checkpointed
+    """
+    abs_path = os.path.abspath(db_path)
+    return abs_path, _stat_identity(abs_path), _stat_identity(abs_path + "-wal")
+
+
+class EngineDataCache(object):
+    """
+    A memo of sandbox.get_engine_data(), get_engine_record() and get_engine_uid_from_name() results that is
+    kept in step with the sandbox database.
+
+    Before each lookup the size and modification time of the database (and its write-ahead log) are compared
+    with the last lookup. Before going to the database on a miss the session connection's PRAGMA data_version,
+    which changes whenever another connection commits, is checked too. When either shows the database has
+    changed the digest of each cached engine (see sandbox.get_engine_digests()) is fetched in one query and
+    only the engines whose digest differs from when they were cached are evicted, along with the name lookups
+    as those are cheap to redo. Repeated lookups of the same engine while the database is unchanged never
+    touch it. The number of entries is bounded and the least recently used are evicted first. When a cache_dir
+    is given the entries are also kept on disk so they survive between runs of a script; they are written by
+    flush(), close() or when the interpreter exits
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.lock = threading.RLock()
+        # (ENGINE_DATA, uid), (ENGINE_RECORD, uid) or (ENGINE_UID, family name, variant name) -> value
+        self.entries = OrderedDict()
+        # engine variant UID -> the sandbox.get_engine_digests() digest of the engine as it was cached
+        self.digests = dict()
+        self.db_identity = None
+        # (id of the session connection, PRAGMA data_version); the version is only comparable on one connection
+        self.data_version = None
+        self.unsaved = False
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @property
+    def cache_path(self):
+        return None if self.cache_dir is None else os.path.join(self.cache_dir, CACHE_FILENAME)
+
+    def get_engine_data(self, variant_uid):
+        """
+        Returns:
+            the same dict sandbox.get_engine_data() would; a shallow copy so callers may add keys to it
+        """
+        return dict(self._get((ENGINE_DATA, variant_uid), self._fetch_engine, variant_uid,
+                              sandbox.engine_data_from_row))
+
+    def get_engine_record(self, variant_uid):
+        """
+        Returns:
+            the same EngineRecord sandbox.get_engine_record() would. Records are shared between callers and
+            their curves are read-only
+        """
+        return self._get((ENGINE_RECORD, variant_uid), self._fetch_engine, variant_uid,
+                         sandbox.EngineRecord.from_row)
+
+    def get_engine_uid_from_name(self, family_name, variant_name):
+        return self._get((ENGINE_UID, family_name, variant_name), sandbox.get_engine_uid_from_name,
+                         family_name, variant_name)
+
+    def get_engine_by_name(self, family_name, variant_name):
+        return self.get_engine_data(self.get_engine_uid_from_name(family_name, variant_name))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.digests.clear()
+            self._save()
+
+    def flush(self):
+        """
+        Write any entries added since the last flush to the cache directory
+        """
+        with self.lock:
+            if self.unsaved:
+                self._save()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _get(self, key, lookup, *args):
+        with self.lock:
+            session = sandbox.get_session()
+            self._check_db_identity(session)
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            self._check_data_version(session)
+            value = lookup(*args)
+            self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self._mark_unsaved()
+            return value
+
+    def _fetch_engine(self, variant_uid, from_row):
+        row = sandbox.get_engine_row(variant_uid)
+        self.digests[variant_uid] = sandbox.get_engine_row_digest(row)
+        return from_row(row)
+
+    def _mark_unsaved(self):
+        if self.cache_dir is not None:
+            self.unsaved = True
+            _unsaved_caches.add(self)
+
+    def _check_db_identity(self, session):
+        db_identity = get_db_identity(session.db_path)
+        if db_identity != self.db_identity:
+            if self.entries:
+                self._revalidate()
+            self.db_identity = db_identity
+            self.data_version = None
+
+    def _check_data_version(self, session):
+        # Catches commits that don't change the size or modification time the database is identified by
+        data_version = (id(session.connection), session.fetchone("PRAGMA data_version")[0])
+        last_connection_id, last_version = self.data_version or (None, None)
+        if last_connection_id == data_version[0] and last_version != data_version[1] and self.entries:
+            self._revalidate()
+        self.data_version = data_version
+
+    def _revalidate(self):
+        """
+        Evict the cached engines that have changed or been deleted since they were cached
+        """
+        cached_uids = {key[1] for key in self.entries if key[0] != ENGINE_UID}
+        current_digests = sandbox.get_engine_digests(cached_uids) if cached_uids else dict()
+        self.digests = {uid: digest for uid, digest in self.digests.items()
+                        if uid in cached_uids and current_digests.get(uid) == digest}
+        for key in list(self.entries):
+            if key[0] == ENGINE_UID or key[1] not in self.digests:
+                del self.entries[key]
+        self._mark_unsaved()
+
+    def _load(self):
+        if self.cache_path is None:
+            return
+        try:
+            with open(self.cache_path, "rb") as f:
+                cached = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+        if cached.get("version") != CACHE_VERSION:
+            return
+        # The entries are revalidated on the first lookup if the database identity no longer matches
+        self.db_identity = cached["db_identity"]
+        self.entries = cached["entries"]
+        self.digests = cached["digests"]
+
+    def _save(self):
+        self.unsaved = False
+        _unsaved_caches.discard(self)
+        if self.cache_path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with utils.atomic_write(self.cache_path) as f:
+            pickle.dump({"version": CACHE_VERSION, "db_identity": self.db_identity, "entries": self.entries,
+                         "digests": self.digests}, f, protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,168 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import glob
+import sqlite3
+import zipfile
+import concurrent.futures
+from collections import OrderedDict
+
+import sim_racing_tools.constants as constants
+import sim_racing_tools.automation.installation as installation
+from sim_racing_tools.automation.car_file_decoder import CarFile
+
+INDEX_FILENAME = "beamng-exports.sqlite"
+
+# Index column -> path of the item within the .car file
+INDEXED_ITEMS = OrderedDict([("VariantUID", "Car/Variant/UID"),
+                             ("VariantName", "Car/Variant/Name"),
+                             ("FamilyName", "Car/Family/Name"),
+                             ("TrimUID", "Car/Trim/UID"),
+                             ("TrimName", "Car/Trim/Name"),
+                             ("ModelName", "Car/Model/Name")])
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS CarFiles (
+    Source TEXT NOT NULL,
+    Member TEXT NOT NULL,
+    ModFolder TEXT NOT NULL,
+    Size INTEGER,
+    MTime INTEGER,
+    {', '.join(f'{column} TEXT' for column in INDEXED_ITEMS)},
+    Error TEXT,
+    PRIMARY KEY (Source, Member)
+);
+CREATE INDEX IF NOT EXISTS CarFilesVariantUID ON CarFiles (VariantUID);
+CREATE INDEX IF NOT EXISTS CarFilesModFolder ON CarFiles (ModFolder);
+"""
+
+
+def get_default_index_path():
+    return os.path.join(constants.get_cache_path(), INDEX_FILENAME)
+
+
+def find_exported_car_files(mod_locations=None):
+    """
+    Find every .car file in the BeamNG mod locations, both in unpacked mod folders and inside zipped mods.
+    A zipped mod is skipped if it has already been unpacked next to the zip file
+
+    Returns:
+        a list of (source path, zip member or "" for unpacked files, mod folder name, size, mtime_ns)
+    """
+    if mod_locations is None:
+        mod_locations = installation.get_beamng_export_paths()
+    car_files = list()
+    for mod_location in mod_locations:
+        if not os.path.isdir(mod_location):
+            continue
+        for entry in sorted(os.scandir(mod_location), key=lambda e: e.name):
+            if entry.is_dir():
+                for car_file in glob.glob(os.path.join(entry.path, "vehicles", "*", "*.car")):
+                    stat = os.stat(car_file)
+                    car_files.append((car_file, "", entry.name, stat.st_size, stat.st_mtime_ns))
+            elif entry.name.lower().endswith(".zip"):
+                mod_folder = entry.name[:-4]
+                if os.path.isdir(os.path.join(mod_location, mod_folder)):
+                    continue
+                stat = entry.stat()
+                try:
+                    with zipfile.ZipFile(entry.path) as zip_file:
+                        members = [m for m in zip_file.namelist()
+                                   if m.startswith("vehicles/") and m.lower().endswith(".car")]
+                except zipfile.BadZipFile:
+                    continue
+                car_files.extend((entry.path, member, mod_folder, stat.st_size, stat.st_mtime_ns)
+                                 for member in members)
+    return car_files
+
+
+def decode_exported_car_file(car_file_info):
+    """
+    Pull the indexed items out of a single exported .car file. This runs inside the worker processes
+
+    Returns:
+        a row for the CarFiles table
+    """
+    source, member, mod_folder, size, mtime = car_file_info
+    values = dict.fromkeys(INDEXED_ITEMS)
+    error = None
+    try:
+        if member:
+            with zipfile.ZipFile(source) as zip_file:
+                car = CarFile(os.path.basename(member), zip_file.read(member))
+                values = car.get_values(INDEXED_ITEMS.values())
+        else:
+            with CarFile.open(source) as car:
+                values = car.get_values(INDEXED_ITEMS.values())
+        values = {column: values[item_path] for column, item_path in INDEXED_ITEMS.items()}
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+    return ((source, member, mod_folder, size, mtime) +
+            tuple(None if values[column] is None else str(values[column]) for column in INDEXED_ITEMS) +
+            (error,))
+
+
+def build_index(index_path=None, mod_locations=None, max_workers=None):
+    """
+    Decode every exported .car file across all of the BeamNG mod locations in a process pool and record
+    what they contain in an SQLite database. Files that haven't changed since the last run are not decoded
+    again and files that no longer exist are removed from the index
+
+    Returns:
+        (number of files decoded, number of files unchanged, number of files removed)
+    """
+    index_path = get_default_index_path() if index_path is None else index_path
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    car_files = find_exported_car_files(mod_locations)
+    with sqlite3.connect(index_path) as conn:
+        conn.executescript(SCHEMA)
+        known = {(row[0], row[1]): (row[2], row[3])
+                 for row in conn.execute("SELECT Source, Member, Size, MTime FROM CarFiles")}
+        found = {(info[0], info[1]) for info in car_files}
+        removed = [key for key in known if key not in found]
+        conn.executemany("DELETE FROM CarFiles WHERE Source = ? AND Member = ?", removed)
+        changed = [info for info in car_files if known.get((info[0], info[1])) != (info[3], info[4])]
+
+        placeholders = ", ".join("?" * (6 + len(INDEXED_ITEMS)))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            conn.executemany(f"INSERT OR REPLACE INTO CarFiles VALUES ({placeholders})",
+                             executor.map(decode_exported_car_file, changed, chunksize=16))
+    return len(changed), len(car_files) - len(changed), len(removed)
+
+
+def find_exports(index_path=None, **column_values):
+    """
+    Query the index e.g. find_exports(VariantUID="1C9B25A04DB1E814879CC8BDA0B1DCF0")
+
+    Returns:
+        a list of sqlite3.Row for each matching .car file
+    """
+    index_path = get_default_index_path() if index_path is None else index_path
+    unknown_columns = set(column_values) - set(INDEXED_ITEMS) - {"ModFolder"}
+    if unknown_columns:
+        raise ValueError(f"Can't search the index by {', '.join(unknown_columns)}")
+    with sqlite3.connect(index_path) as conn:
+        conn.row_factory = sqlite3.Row
+        query = "SELECT * FROM CarFiles"
+        if column_values:
+            query += " WHERE " + " AND ".join(f"{column} = ?" for column in column_values)
+        return conn.execute(query + " ORDER BY ModFolder", tuple(column_values.values())).fetchall()
@@ -21,11 +21,13 @@ along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
 import os
 import glob
 import math
+import numpy as np
 
 import sim_racing_tools.automation.installation as installation
-import sim_racing_tools.automation.sandbox as sandbox
+import sim_racing_tools.automation.engine_data_cache as engine_data_cache
 import sim_racing_tools.utils as utils
-from sim_racing_tools.automation.car_file_decoder import CarFile
+import sim_racing_tools.curves as curves
+from sim_racing_tools.automation.car_file_cache import CarFileCache
 from sim_racing_tools.automation.jbeam import Parser as JBeamParser
 
 import sim_racing_tools.assetto_corsa.car.engine as ac_engine
@@ -87,11 +89,12 @@ class DefaultEngineFabricator(object):
         self.version = LATEST_VERSION if not version else version
         self.use_csp_physics_extensions = use_csp_physics_extensions
         self.mechanical_efficiency = mechanical_efficiency
+        self.engine_data_cache = engine_data_cache.EngineDataCache(cache_dir=engine_data_cache.get_default_cache_dir())
 
     def create_from_beamng_mod(self, beamng_mod_folder_name):
         data_dir = get_mod_data_dir(beamng_mod_folder_name)
         car_data = load_car_file_data(data_dir)
-        engine_db_data = sandbox.get_engine_data(car_data['Car']['Variant']['UID'])
+        engine_db_data = self.engine_data_cache.get_engine_record(car_data['Car']['Variant']['UID'])
         jbeam_engine_data = JBeamParser().naive_parse(os.path.join(data_dir, installation.ENGINE_JBEAM_NAME))
         params = version_to_parameter_selector[self.version](car_data, engine_db_data, jbeam_engine_data)
 
@@ -115,16 +118,19 @@ def set_metadata(engine_object, engine_db_data):
     engine_object.metadata.source = ac_engine.EngineSources.AUTOMATION
     engine_object.metadata.mass_kg = round(engine_db_data["Weight"])
     engine_object.metadata.info_dict["automation-version"] = engine_db_data["GameVersion"]
-    engine_object.metadata.info_dict["automation-data"] = engine_db_data
+    # The curves are held as numpy arrays; store them as lists so they can be written out as TOML
+    engine_object.metadata.info_dict["automation-data"] = {k: v.tolist() if isinstance(v, np.ndarray) else v
+                                                           for k, v in engine_db_data.items()}
 
 
 def set_ui_data(engine_object, engine_db_data):
     ui_data = ac_engine.EngineUIData()
-    ui_data.torque_curve = [[str(round(rpm)), str(round(engine_db_data["TorqueCurve"][idx]))]
-                            for idx, rpm in enumerate(engine_db_data["RPMCurve"])]
+    rpm_points = curves.round_to_int(engine_db_data["RPMCurve"])
+    ui_data.torque_curve = [[str(rpm), str(torque)]
+                            for rpm, torque in zip(rpm_points, curves.round_to_int(engine_db_data["TorqueCurve"]))]
     ui_data.max_torque = f"{round(engine_db_data['PeakTorque'])}Nm"
-    ui_data.power_curve = [[str(round(rpm)), str(round(utils.kw_to_bhp(engine_db_data["PowerCurve"][idx])))]
-                           for idx, rpm in enumerate(engine_db_data["RPMCurve"])]
+    ui_data.power_curve = [[str(rpm), str(power)] for rpm, power in
+                           zip(rpm_points, curves.round_to_int(curves.kw_to_bhp(engine_db_data["PowerCurve"])))]
     ui_data.max_power = f"{round(utils.kw_to_bhp(engine_db_data['PeakPower']))}bhp"
     engine_object.metadata.ui_data = ui_data
 
@@ -179,11 +185,10 @@ def get_extended_fuel_consumption_v1(engine_db_data, mechanical_efficiency):
     fuel_use_grams_per_sec = ((engine_db_data['EconCurve'][rpm_index]/3600000) *
                               (engine_db_data['PowerCurve'][rpm_index] * 1000))
     data.max_fuel_flow = round(fuel_use_grams_per_sec * 3.6)
-    data.max_fuel_flow_lut = dict()
-    for rpm_index, rpm in enumerate(engine_db_data["RPMCurve"]):
-        fuel_use_grams_per_sec = ((engine_db_data['EconCurve'][rpm_index]/3600000) *
-                                  (engine_db_data['PowerCurve'][rpm_index] * 1000))
-        data.max_fuel_flow_lut[int(rpm)] = round(fuel_use_grams_per_sec * 3.6)
+    fuel_use_grams_per_sec = ((np.asarray(engine_db_data['EconCurve'], dtype=np.float64) / 3600000) *
+                              (np.asarray(engine_db_data['PowerCurve'], dtype=np.float64) * 1000))
+    data.max_fuel_flow_lut = {int(rpm): flow for rpm, flow in
+                              zip(engine_db_data["RPMCurve"], curves.round_to_int(fuel_use_grams_per_sec * 3.6))}
     return data
 
 
@@ -193,7 +198,7 @@ def set_power_info_v1(engine_object, engine_db_data, mechanical_efficiency):
     else:
         write_turbo_torque_curve(engine_object, engine_db_data, mechanical_efficiency)
         create_turbo_sections_v1(engine_object, engine_db_data)
-        engine_object.metadata.boost_curve = {round(rpm): engine_db_data["BoostCurve"][idx]
+        engine_object.metadata.boost_curve = {round(rpm): float(engine_db_data["BoostCurve"][idx])
                                               for idx, rpm in enumerate(engine_db_data["RPMCurve"])}
 
     rpm_increments = engine_db_data["RPMCurve"][-1] - engine_db_data["RPMCurve"][-2]
@@ -244,17 +249,16 @@ def calculate_pumping_losses(engine_db_data):
 
 
 def write_na_torque_curve(engine, engine_data, mechanical_efficiency):
-    for idx in range(0, len(engine_data["RPMCurve"])):
-        engine.power_info.rpm_curve.append(round(engine_data["RPMCurve"][idx]))
-        engine.power_info.torque_curve.append(round(engine_data["TorqueCurve"][idx] * mechanical_efficiency))
+    engine.power_info.rpm_curve.extend(curves.round_to_int(engine_data["RPMCurve"]))
+    engine.power_info.torque_curve.extend(
+        curves.round_to_int(np.asarray(engine_data["TorqueCurve"], dtype=np.float64) * mechanical_efficiency))
 
 
 def write_turbo_torque_curve(engine, engine_data, mechanical_efficiency):
-    for idx in range(0, len(engine_data["RPMCurve"])):
-        engine.power_info.rpm_curve.append(round(engine_data["RPMCurve"][idx]))
-        boost_pressure = max(0, engine_data["BoostCurve"][idx])
-        engine.power_info.torque_curve.append(round((engine_data["TorqueCurve"][idx] /
-                                                     (1+boost_pressure)) * mechanical_efficiency))
+    engine.power_info.rpm_curve.extend(curves.round_to_int(engine_data["RPMCurve"]))
+    engine.power_info.torque_curve.extend(
+        curves.round_to_int(curves.remove_boost(engine_data["TorqueCurve"], engine_data["BoostCurve"]) *
+                            mechanical_efficiency))
 
 
 def create_turbo_sections_v1(engine, engine_data):
@@ -294,12 +298,13 @@ def get_mod_data_dir(beamng_mod_folder_name):
 
 
 def load_car_file_data(directory):
+    """
+    Get the decoded contents of the .car file in directory; this is served from the CarFileCache when
+    the file hasn't changed since it was last decoded
+    """
     try:
         car_file = glob.glob(f"{directory}/*.car")[0]
     except IndexError:
         raise RuntimeError(f"No .car file present in {directory}")
-
-    with open(car_file, "rb") as f:
-        car = CarFile(os.path.basename(car_file), f.read())
-        car.parse()
-        return car.get_data()
+    with CarFileCache() as cache:
+        return cache.get_data(car_file)
@@ -21,13 +21,13 @@ along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
 
 import sys
 import math
-import struct
 import sqlite3
 import toml
-import logging
 
 from collections import OrderedDict
 import sim_racing_tools.automation.installation as installation
+import sim_racing_tools.automation.sandbox as sandbox
+import sim_racing_tools.automation.sandbox_curves as sandbox_curves
 
 SAMPLE_VARIANT_UID = 'B70604DD4EF0BE1E016E1F9559D67659'
 SANDBOX_DB_FILE_PATH = None
@@ -72,60 +72,50 @@ def write_resource_summary(variant_uid, out_file):
         toml.dump(get_resource_data(variant_uid), f)
 
 
-def _decode_double(blob_bytes):
-    logging.debug(" ".join(f'{b:02X}' for b in blob_bytes))
-    return struct.unpack("d", bytearray(blob_bytes))[0]
-
-
-def _decode_blob(blob_bytes):
-    # skip blob header
-    logging.debug(f'Blob length: {len(blob_bytes)}')
-    data = blob_bytes[2:]
-    num_data_points = struct.unpack("<LL", bytearray(data[0:8]))[0]
-    logging.debug(f'Num data points: {num_data_points}')
-    data = data[8:]
-    current_pos = 0
-    collected_points = 0
-    out_list = list()
-    while collected_points < num_data_points:
-        logging.debug(f'{data[current_pos]:02X}')
-        current_pos += 1
-        logging.debug(f'{_decode_double(data[current_pos:current_pos+8])}')
-        current_pos += 9
-        out_list.append(_decode_double(data[current_pos:current_pos+8]))
-        current_pos += 8
-        collected_points += 1
-    return out_list
+ENGINE_GRAPH_COLUMNS = OrderedDict([("rpm", 'RPMCurve'),
+                                    ("power", 'PowerCurve'),
+                                    ("torque", 'TorqueCurve'),
+                                    ('econ', 'EconCurve'),
+                                    ('econ-eff', 'EconEffCurve'),
+                                    ('boost', 'BoostCurve')])
 
 
 def get_engine_graph_data(variant_uid):
-    with sqlite3.connect(installation.get_sandbox_db_path()) as conn:
-        conn.row_factory = sqlite3.Row
-        conn.text_factory = bytes
-        cur = conn.cursor()
-        data = cur.execute('SELECT * from EngineCurves where uid = ?', (variant_uid,)).fetchone()
-        collection_data = {"rpm": 'RPMCurve',
-                           "power": 'PowerCurve',
-                           "torque": 'TorqueCurve',
-                           'econ': 'EconCurve',
-                           'econ-eff': 'EconEffCurve',
-                           'boost': 'BoostCurve'}
-        data_dict = OrderedDict()
-        for header, column_name in collection_data.items():
-            logging.debug(f'{header} data')
-            logging.debug(" ".join(f'{b:02X}' for b in data[column_name]))
-            data_dict[header] = _decode_blob(data[column_name])
-        return data_dict
+    columns = ", ".join(f"CAST({column} AS BLOB) AS {column}" for column in ENGINE_GRAPH_COLUMNS.values())
+    data = sandbox.get_session().fetchone(f'SELECT {columns} from EngineCurves where uid = ?', (variant_uid,))
+    data_dict = OrderedDict()
+    for header, values in zip(ENGINE_GRAPH_COLUMNS.keys(),
+                              sandbox.decode_curve_blobs(data[column] for column in ENGINE_GRAPH_COLUMNS.values())):
+        data_dict[header] = values.tolist()
+    return data_dict
 
 
 def get_trim_graph_data(trim_uid):
-    with sqlite3.connect(installation.get_sandbox_db_path()) as conn:
-        conn.row_factory = sqlite3.Row
-        conn.text_factory = bytes
-        cur = conn.cursor()
-        data = cur.execute('SELECT * from TrimGraphData where uid = ?', (trim_uid,)).fetchone()
-        graph_data = _decode_blob(data["GraphData"])
-    return graph_data
+    query = 'SELECT CAST(GraphData AS BLOB) AS GraphData from TrimGraphData where uid = ?'
+    data = sandbox.get_session().fetchone(query, (trim_uid,))
+    return sandbox.decode_curve_blob(data["GraphData"]).tolist()
+
+
+def get_all_engine_graph_data(out_dir=None):
+    """
+    Decode the curves of every engine in the sandbox at once
+    Args:
+        out_dir: a directory to write the curves to as memory-mapped .npy files rather than holding them in memory
+    Returns:
+        a CurveTable with a column for each curve in sandbox.ENGINE_CURVES order
+    """
+    return sandbox_curves.decode_engine_curves(out_dir)
+
+
+def get_all_trim_graph_data(out_dir=None):
+    """
+    Decode the graph data of every trim in the sandbox at once
+    Args:
+        out_dir: a directory to write the curves to as memory-mapped .npy files rather than holding them in memory
+    Returns:
+        a CurveTable with a single GraphData column
+    """
+    return sandbox_curves.decode_trim_graph_data(out_dir)
 
 
 def write_engine_performance_summary(variant_uid, out_file):
@@ -19,216 +19,129 @@ You should have received a copy of the GNU General Public License
 along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
 """
 
+import re
 import logging
 
-LIST = 0
-DICT = 1
-
-
-#  Start by looking for key starting with "
-#  Once found there will then be a ":" then it could be could be one of 4 things:
-#    string - "
-#    dict - {
-#    list - [
-#    number - any other char
-class ParseState(object):
-    ATTRIBUTE_NAME_SEARCH = 0
-    ATTRIBUTE_VALUE_SEARCH = 1
-
-
-class NewLineFound(IndexError):
-    def __init__(self):
-        super(NewLineFound, self).__init__("Found new line")
+# JBeam is JSON with comments where the commas between items are optional (and often missing or trailing).
+# Whitespace, commas and comments all separate tokens so they're skipped as part of matching the next token
+SEPARATORS = r"(?:\s|,|//[^\n]*|/\*.*?\*/)*"
+SEPARATOR = re.compile(SEPARATORS, re.DOTALL)
+TOKEN = re.compile(SEPARATORS + r"""(?:
+    "(?P<string>[^"]*)"
+  | (?P<float>-?(?:\d+\.\d*|\.\d+|\d+(?=[eE]))(?:[eE][-+]?\d+)?)
+  | (?P<int>-?\d+)
+  | (?P<open>[{\[])
+  | (?P<close>[}\]])
+  | (?P<colon>:)
+  | (?P<literal>true|false|null)\b
+  | (?P<end>\Z)
+)""", re.VERBOSE | re.DOTALL | re.IGNORECASE)
+LITERALS = {"true": True, "false": False, "null": None}
+CLOSING = {"}": dict, "]": list}
 
 
 class Parser(object):
+    """
+    Parses a JBeam file in a single pass over its contents. The top level object of the file is returned
+    as data_dict with nested objects as dicts and arrays as lists
+    """
     def __init__(self):
         self.data_dict = dict()
-        self.container_stack = [self.data_dict]
-        self.current_container = self.container_stack[-1]
-        self.line = None
-        self.idx = 0
-        self.current_attribute_name = None
-
-        self.state = ParseState.ATTRIBUTE_NAME_SEARCH
 
     def naive_parse(self, filename):
         with open(filename, "r") as f:
-            return self._naive_parse(f.readlines(), logging.getLogger("jbeam_load"))
+            return self.parse_string(f.read(), logging.getLogger("jbeam_load"))
 
-    def _naive_parse(self, jbeam_lines, logger):
-        line_idx = 0
+    def parse_string(self, text, logger=None):
         try:
-            for line_idx, line in enumerate(jbeam_lines, start=1):
-                self.idx = 0
-                if line[0] == "{":
-                    continue
-                self.line = line.strip()
-                comment_start = self.line.find("//")
-                if comment_start >= 0:
-                    comment = line[comment_start:-1]
-                    logger.info(f"Removing {comment} from line {line_idx}")
-                    self.line = self.line[:comment_start] + "\n"
-                self._parse_line()
-        except Exception as e:
-            err_msg = f"Error on line {line_idx}: {str(e)}\n {self.line}"
-            logger.error(err_msg)
-            raise ValueError(err_msg)
-        return self.data_dict
-
-    def _parse_string(self):
-        if self.line[self.idx] != '"':
-            raise ValueError("String doesn't start with a \"")
-        self.idx += 1
-        ending_quote_idx = self.line[self.idx:].index('"')
-        string = self.line[self.idx:self.idx+ending_quote_idx]
-        self.idx += ending_quote_idx + 1
-        return string
-
-    def _parse_number(self):
-        is_float = False
-        found_non_digit = False
-        first_char = True
-        for number_end, char in enumerate(self.line[self.idx:]):
-            if first_char:
-                first_char = False
-                if char == "-":
-                    continue
-            if char.isdigit():
-                continue
-            if char == ".":
-                if is_float:
-                    raise ValueError("Unknown number type containing multiple decimal places")
-                is_float = True
-            else:
-                found_non_digit = True
+            return self._parse(text)
+        except ValueError as e:
+            if logger is not None:
+                logger.error(str(e))
+            raise
+
+    def _parse(self, text):
+        container_stack = list()
+        container = None
+        key = None
+        expecting_colon = False
+        finished = False
+        pos = 0
+        match_token = TOKEN.match
+        while True:
+            match = match_token(text, pos)
+            if match is None:
+                pos = SEPARATOR.match(text, pos).end()
+                raise self._error(text, pos, f"Unexpected char {text[pos]}")
+            kind = match.lastgroup
+            if kind == "end":
                 break
-        if not found_non_digit:
-            number_end += 1
-        if is_float:
-            val = float(self.line[self.idx:self.idx+number_end])
-        else:
-            val = int(self.line[self.idx:self.idx+number_end])
-        self.idx += number_end
-        return val
-
-    def _parse_bool(self):
-        if self.line[self.idx] in ["T", "t"]:
-            val = bool(self.line[self.idx:self.idx+4])
-            self.idx += 4
-            return val
-        else:
-            val = bool(self.line[self.idx:self.idx+5])
-            self.idx += 5
-            return val
-
-    def _found_container_close(self):
-        return self.line[self.idx] in ["}", "]"]
-
-    def _parse_container_close(self):
-        self._pop_container()
-        self.idx += 1
-
-    def _parse_line(self):
-        while self.idx < len(self.line):
-            if self.state == ParseState.ATTRIBUTE_NAME_SEARCH:
-                try:
-                    self.idx = self._find_next_char()
-                except (NewLineFound, ValueError):
-                    return
-
-                if self._found_container_close():
-                    self._parse_container_close()
-                    continue
-
-                if self.line[self.idx] != '"':
-                    raise ValueError(f"Was expecting an attribute name but found {self.line[self.idx]} at position "
-                                     f"{self.idx}")
-                attribute_name = self._parse_string()
-                self.idx = self.idx + self.line[self.idx:].index(":") + 1
-                self._attribute_name_found(attribute_name)
+            pos = match.start(kind)
+            if finished:
+                raise self._error(text, pos, "Found more data after the end of the top level object")
+            if expecting_colon:
+                if kind != "colon":
+                    raise self._error(text, pos, f"Was expecting a : after attribute name {key}")
+                expecting_colon = False
+                pos = match.end()
                 continue
 
-            try:
-                self.idx = self._find_next_char()
-            except (NewLineFound, ValueError):
-                return
-
-            if self.line[self.idx] == '"':
-                self._add_value(self._parse_string())
-                continue
-            elif self.line[self.idx].isdigit() or self.line[self.idx] == "-":
-                self._add_value(self._parse_number())
-                continue
-            elif self.line[self.idx] in ["T", "t", "F", "f"]:
-                self._add_value(self._parse_bool())
-                continue
-            elif self._found_container_close():
-                self._parse_container_close()
-                continue
-
-            if self.line[self.idx] == '{':
-                self._add_container(dict())
-            elif self.line[self.idx] == '[':
-                self._add_container(list())
+            if kind == "open":
+                new_container = dict() if match.group(kind) == "{" else list()
+                if container is None:
+                    if type(new_container) != dict:
+                        raise self._error(text, pos, "The top level of a JBeam file must be an object")
+                    container = self.data_dict
+                else:
+                    self._add_value(text, pos, container, key, new_container)
+                    key = None
+                    container_stack.append(container)
+                    container = new_container
+            elif kind == "close":
+                if container is None or type(container) != CLOSING[match.group(kind)]:
+                    raise self._error(text, pos, f"Unexpected {match.group(kind)}")
+                if key is not None:
+                    raise self._error(text, pos, f"Attribute {key} has no value")
+                if container_stack:
+                    container = container_stack.pop()
+                else:
+                    finished = True
+            elif kind == "string" and type(container) == dict and key is None:
+                key = match.group(kind)
+                expecting_colon = True
+            elif kind == "colon":
+                raise self._error(text, pos, "Found a : without an attribute name")
             else:
-                raise ValueError(f"Unexpected char {self.line[self.idx]} at position {self.idx}")
-            self.idx += 1
-
-    def _attribute_name_found(self, name):
-        self.state = ParseState.ATTRIBUTE_VALUE_SEARCH
-        self.current_attribute_name = name
-
-    def _attribute_stored(self):
-        self.state = ParseState.ATTRIBUTE_NAME_SEARCH
-        self.current_attribute_name = None
-
-    def _current_container_type(self):
-        return type(self.current_container)
-
-    def _find_next_char(self):
-        for idx, char in enumerate(self.line[self.idx:]):
-            if char == "\n":
-                raise NewLineFound()
-            if char.isspace() or char == ",":
-                continue
-            return self.idx + idx
-        raise ValueError("Couldn't find a non-space char on current line")
-
-    def _push_container(self, container):
-        self.container_stack.append(container)
-        self.current_container = self.container_stack[-1]
-        self._set_state_for_current_container()
-
-    def _pop_container(self):
-        self.container_stack.pop()
-        if len(self.container_stack):
-            self.current_container = self.container_stack[-1]
-        self._set_state_for_current_container()
-
-    def _add_container(self, container):
-        if self._current_container_type() == list:
-            self.current_container.append(container)
-            self._push_container(self.current_container[-1])
-        else:
-            if self.current_attribute_name is None:
-                raise ValueError(f"Cannot add {type(container)} to dict without a key")
-            self.current_container[self.current_attribute_name] = container
-            self._push_container(self.current_container[self.current_attribute_name])
-            self.current_attribute_name = None
-
-    def _add_value(self, value):
-        if self._current_container_type() == list:
-            self.current_container.append(value)
-        else:
-            if self.current_attribute_name is None:
-                raise ValueError(f"Cannot add {type(value)} to dict without a key")
-            self.current_container[self.current_attribute_name] = value
-            self.state = ParseState.ATTRIBUTE_NAME_SEARCH
-            self.current_attribute_name = None
+                if container is None:
+                    raise self._error(text, pos, "Found a value outside of the top level object")
+                if kind == "string":
+                    value = match.group(kind)
+                elif kind == "float":
+                    value = float(match.group(kind))
+                elif kind == "int":
+                    value = int(match.group(kind))
+                else:
+                    value = LITERALS[match.group(kind).lower()]
+                self._add_value(text, pos, container, key, value)
+                key = None
+            pos = match.end()
+
+        if container_stack or (container is not None and not finished):
+            raise self._error(text, len(text), "Reached the end of the file before every object and array was closed")
+        return self.data_dict
 
-    def _set_state_for_current_container(self):
-        if self._current_container_type() == dict:
-            self.state = ParseState.ATTRIBUTE_NAME_SEARCH
-        else:
-            self.state = ParseState.ATTRIBUTE_VALUE_SEARCH
+    def _add_value(self, text, pos, container, key, value):
+        if type(container) == list:
+            container.append(value)
+            return
+        if key is None:
+            raise self._error(text, pos, f"Cannot add {type(value)} to dict without a key")
+        container[key] = value
+
+    @staticmethod
+    def _error(text, pos, message):
+        line_idx = text.count("\n", 0, pos) + 1
+        line_start = text.rfind("\n", 0, pos) + 1
+        line_end = text.find("\n", pos)
+        line = text[line_start:line_end if line_end >= 0 else len(text)]
+        return ValueError(f"Error on line {line_idx}: {message} at position {pos - line_start}\n {line.strip()}")
@@ -20,12 +20,187 @@ along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
 """
 
 import os
+import bisect
 import struct
+import difflib
+import hashlib
+import pathlib
 import sqlite3
-import logging
+import itertools
+import threading
+import collections.abc
+import numpy as np
 from collections import OrderedDict
 import sim_racing_tools.automation.installation as installation
 
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+DEFAULT_CACHE_SIZE_KIB = 64 * 1024
+
+
+# The indexes added to a snapshot; each covers the columns the lookups in this module search and join on
+SNAPSHOT_INDEXES = [("SnapshotVariantsUID", "Variants", ("UID", "FUID", "Name")),
+                    ("SnapshotVariantsFUIDName", "Variants", ("FUID", "Name", "UID")),
+                    ("SnapshotFamiliesUID", "Families", ("UID", "Name")),
+                    ("SnapshotFamiliesName", "Families", ("Name", "UID")),
+                    ("SnapshotEngineResultsUID", "EngineResults", ("UID",)),
+                    ("SnapshotEngineCurvesUID", "EngineCurves", ("UID",))]
+
+
+class SandboxSession(object):
+    """
+    A single read-only connection to the sandbox database that is shared by every lookup made while it is
+    active. The connection is opened on first use in read-only URI mode and can be used from any thread;
+    queries are serialised on a lock.
+
+    Every lookup in this module uses the default session unless a session has been entered as a context
+    manager on the same thread; this gives batch jobs a dedicated connection with their own settings that is
+    closed once done without affecting lookups made on other threads:
+
+    with SandboxSession(immutable=True):
+        for uid in uids:
+            get_engine_data(uid)
+
+    A session can instead work from a snapshot: the database is copied once with the SQLite backup API when
+    the session connects, indexes are added to the copy for the lookups made here and every query is served
+    from it. Long analysis jobs then read at memory speed and never contend with Automation for locks, at the
+    cost of not seeing changes made after the copy
+    """
+    def __init__(self, db_path=None, immutable=False, mmap_size=DEFAULT_MMAP_SIZE,
+                 cache_size_kib=DEFAULT_CACHE_SIZE_KIB, snapshot=False):
+        """
+        Args:
+            db_path: the database to open; defaults to the Automation sandbox database
+            immutable: promise SQLite the file won't change while the session is open so it can skip all
+                       locking. Only safe when Automation isn't running
+            mmap_size: the number of bytes of the database SQLite may memory-map
+            cache_size_kib: the size of the page cache in KiB
+            snapshot: False to query the database directly, True to copy it into memory or the path of a
+                      file to copy it to, e.g. on a tmpfs. A snapshot file is removed when the session closes
+        """
+        self.db_path = installation.get_sandbox_db_path() if db_path is None else db_path
+        self.immutable = immutable
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.snapshot = snapshot
+        self.lock = threading.RLock()
+        self.name_index = None
+        self.name_index_version = None
+        self._connection = None
+
+    @property
+    def uri(self):
+        uri = f"{pathlib.Path(os.path.abspath(self.db_path)).as_uri()}?mode=ro"
+        if self.immutable:
+            uri += "&immutable=1"
+        return uri
+
+    @property
+    def connection(self):
+        with self.lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            return self._connection
+
+    def _connect(self):
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        if self.snapshot:
+            conn = self._take_snapshot(conn)
+        conn.row_factory = sqlite3.Row
+        register_curve_functions(conn)
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    def _take_snapshot(self, source):
+        snapshot_path = ":memory:" if self.snapshot is True else self.snapshot
+        snapshot = sqlite3.connect(snapshot_path, check_same_thread=False)
+        try:
+            with source:
+                source.backup(snapshot)
+        finally:
+            source.close()
+        for index_name, table, columns in SNAPSHOT_INDEXES:
+            snapshot.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})")
+        snapshot.execute("ANALYZE")
+        snapshot.commit()
+        return snapshot
+
+    def fetchone(self, query, parameters=()):
+        with self.lock:
+            return self.connection.execute(query, parameters).fetchone()
+
+    def fetchall(self, query, parameters=()):
+        with self.lock:
+            return self.connection.execute(query, parameters).fetchall()
+
+    def iterate(self, query, parameters=(), batch_size=1000):
+        """
+        Yield the rows of a query, fetching batch_size at a time so a large result is never held in memory
+        at once. The lock is only held while a batch is fetched
+        """
+        with self.lock:
+            cursor = self.connection.execute(query, parameters)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+    def close(self):
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+                self.name_index = None
+                if self.snapshot and self.snapshot is not True and os.path.exists(self.snapshot):
+                    os.remove(self.snapshot)
+
+    def __enter__(self):
+        _get_active_sessions().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _get_active_sessions().remove(self)
+        self.close()
+
+
+_session_lock = threading.Lock()
+# Each thread has its own stack of the sessions it has entered; only the default session is shared
+_thread_state = threading.local()
+_default_session = None
+
+
+def _get_active_sessions():
+    if not hasattr(_thread_state, "active_sessions"):
+        _thread_state.active_sessions = list()
+    return _thread_state.active_sessions
+
+
+def get_session():
+    """
+    Returns:
+        the innermost SandboxSession entered as a context manager on this thread or else the shared default
+        session
+    """
+    global _default_session
+    active_sessions = _get_active_sessions()
+    if active_sessions:
+        return active_sessions[-1]
+    with _session_lock:
+        if _default_session is None:
+            _default_session = SandboxSession()
+        return _default_session
+
+
+def close_default_session():
+    global _default_session
+    with _session_lock:
+        if _default_session is not None:
+            _default_session.close()
+            _default_session = None
+
 
 def get_engine_bill_of_material_params():
     return {"EngineeringCost", "EngineeringTime", "ManHours",
@@ -35,13 +210,9 @@ def get_engine_bill_of_material_params():
 def get_engine_bill_of_materials(variant_uid):
     resource_stats_to_collect = get_engine_bill_of_material_params()
     data_dict = OrderedDict()
-    with sqlite3.connect(os.path.join(installation.get_userdata_path(),
-                                      installation.SANDBOX_DB_NAME)) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        row = cur.execute('SELECT * FROM EngineResults WHERE UID = ?', (variant_uid,)).fetchone()
-        for stat in resource_stats_to_collect:
-            data_dict[stat] = row[stat]
+    row = get_session().fetchone('SELECT * FROM EngineResults WHERE UID = ?', (variant_uid,))
+    for stat in resource_stats_to_collect:
+        data_dict[stat] = row[stat]
     return data_dict
 
 
@@ -50,18 +221,11 @@ def get_engine_graph_data_params():
 
 
 def get_engine_graph_data(variant_uid):
-    with sqlite3.connect(os.path.join(installation.get_userdata_path(),
-                                      installation.SANDBOX_DB_NAME)) as conn:
-        conn.row_factory = sqlite3.Row
-        conn.text_factory = bytes
-        cur = conn.cursor()
-        data = cur.execute('SELECT * from EngineCurves where uid = ?', (variant_uid,)).fetchone()
-        data_dict = OrderedDict()
-        for header in get_engine_graph_data_params():
-            # logging.debug(f'{header} data')
-            # logging.debug(" ".join(f'{b:02X}' for b in data[column_name]))
-            data_dict[header] = _decode_blob(data[header])
-        return data_dict
+    # The curves are read as BLOBs whatever type they were stored with so they always come back as bytes
+    columns = get_engine_graph_data_params()
+    query = f"SELECT {', '.join(f'CAST({c} AS BLOB) AS {c}' for c in columns)} from EngineCurves where uid = ?"
+    data = get_session().fetchone(query, (variant_uid,))
+    return OrderedDict(zip(columns, decode_curve_blobs(data[header] for header in columns)))
 
 
 def get_engine_performance_data_params():
@@ -71,13 +235,9 @@ def get_engine_performance_data_params():
 
 
 def get_engine_performance_data(variant_uid):
-    with sqlite3.connect(os.path.join(installation.get_userdata_path(),
-                                      installation.SANDBOX_DB_NAME)) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        engine_result_columns = get_engine_performance_data_params()
-        query = f"SELECT {', '.join(engine_result_columns)} FROM EngineResults WHERE uid = ?"
-        return cur.execute(query, (variant_uid,)).fetchone()
+    engine_result_columns = get_engine_performance_data_params()
+    query = f"SELECT {', '.join(engine_result_columns)} FROM EngineResults WHERE uid = ?"
+    return get_session().fetchone(query, (variant_uid,))
 
 
 def get_variant_data_params():
@@ -110,61 +270,459 @@ def get_engine_data_params():
     return params
 
 
-def get_engine_data(variant_uid):
-    with sqlite3.connect(os.path.join(installation.get_userdata_path(),
-                                      installation.SANDBOX_DB_NAME)) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        variant_columns = get_variant_data_params()
-        query = f"SELECT {', '.join(variant_columns)} from Variants where uid = ?"
-        row = cur.execute(query, (variant_uid,)).fetchone()
-        data_dict = {k: row[k] for k in row.keys()}
-        family_row = cur.execute('SELECT * from Families where uid = ?',
-                                 (data_dict['FUID'],)).fetchone()
-        for family_key, data_key in get_family_mapping().items():
-            data_dict[data_key] = family_row[family_key]
-        data_dict.update(get_engine_performance_data(variant_uid))
-        data_dict.update(get_engine_bill_of_materials(variant_uid))
-        data_dict.update(get_engine_graph_data(variant_uid))
+def get_engine_data_columns():
+    """
+    Returns:
+        a list of (select expression, data key) pairs that pull everything in get_engine_data_params()
+        out of the Variants/Families/EngineResults/EngineCurves join
+    """
+    columns = [(f"Variants.{c}", c) for c in sorted(get_variant_data_params())]
+    columns.extend((f"Families.{c}", k) for c, k in get_family_mapping().items())
+    result_columns = get_engine_performance_data_params() | get_engine_bill_of_material_params()
+    columns.extend((f"EngineResults.{c}", c) for c in sorted(result_columns))
+    # The curves are read as BLOBs whatever type they were stored with so they always come back as bytes
+    columns.extend((f"CAST(EngineCurves.{c} AS BLOB)", c) for c in sorted(get_engine_graph_data_params()))
+    return columns
+
+
+def _make_engine_data_query(where_clause):
+    select = ", ".join(f"{expression} AS {key}" for expression, key in get_engine_data_columns())
+    return f"SELECT {select} FROM Variants " \
+           f"JOIN Families ON Families.UID = Variants.FUID " \
+           f"JOIN EngineResults ON EngineResults.UID = Variants.UID " \
+           f"JOIN EngineCurves ON EngineCurves.UID = Variants.UID " \
+           f"WHERE {where_clause}"
+
+
+ENGINE_DATA_QUERY = _make_engine_data_query("Variants.UID = ?")
+
+
+def engine_data_from_row(row):
+    """
+    Returns:
+        the engine data dict get_engine_data() returns built from a row returned by get_engine_row()
+    """
+    data_dict = {k: row[k] for k in row.keys()}
+    headers = get_engine_graph_data_params()
+    data_dict.update(zip(headers, decode_curve_blobs(data_dict[header] for header in headers)))
     return data_dict
 
 
+def get_engine_data(variant_uid):
+    """
+    Collect everything listed in get_engine_data_params() about an engine variant in a single query
+    Args:
+        variant_uid: the UID of the engine variant
+    Returns:
+        a dict of the engine data
+    Raises:
+        KeyError if no complete engine with that UID exists in the sandbox
+    """
+    return engine_data_from_row(get_engine_row(variant_uid))
+
+
+def get_engine_row(variant_uid):
+    """
+    Returns:
+        the raw sqlite3.Row of everything get_engine_data() reads about an engine variant with the curves left
+        as blobs
+    Raises:
+        KeyError if no complete engine with that UID exists in the sandbox
+    """
+    row = get_session().fetchone(ENGINE_DATA_QUERY, (variant_uid,))
+    if row is None:
+        raise KeyError(f"No engine variant with UID {variant_uid} in the sandbox")
+    return row
+
+
+def get_engine_data_many(variant_uids=None, chunk_size=500):
+    """
+    Collect the engine data for many engine variants using one query per chunk of UIDs rather than one per
+    engine. Variants that aren't in the sandbox are skipped
+    Args:
+        variant_uids: an iterable of engine variant UIDs; every variant in the sandbox if None
+        chunk_size: how many UIDs to look up in each query. Kept below SQLite's default limit of 999 bound
+                    parameters
+    Returns:
+        a generator of engine data dicts (as returned by get_engine_data) in no particular order
+    """
+    for row in _iter_engine_rows(variant_uids, chunk_size):
+        yield engine_data_from_row(row)
+
+
+def _iter_engine_rows(variant_uids, chunk_size):
+    session = get_session()
+    if variant_uids is None:
+        variant_uids = [row["UID"] for row in session.fetchall("SELECT UID FROM Variants")]
+    chunk = list()
+    for variant_uid in variant_uids:
+        chunk.append(variant_uid)
+        if len(chunk) == chunk_size:
+            yield from _get_engine_rows_chunk(session, chunk)
+            chunk = list()
+    if chunk:
+        yield from _get_engine_rows_chunk(session, chunk)
+
+
+def _get_engine_rows_chunk(session, variant_uids):
+    query = _make_engine_data_query(f"Variants.UID IN ({', '.join('?' * len(variant_uids))})")
+    return session.fetchall(query, variant_uids)
+
+
+def get_engine_digests(variant_uids=None, chunk_size=500):
+    """
+    Args:
+        variant_uids: an iterable of engine variant UIDs; every variant in the sandbox if None. Variants that
+                      aren't in the sandbox are left out of the result
+        chunk_size: how many UIDs to look up in each query
+    Returns:
+        a dict of engine variant UID -> a digest of the raw values of every column get_engine_data() reads for
+        it. The digest of an engine changes whenever anything get_engine_data() would return for it does
+    """
+    if variant_uids is None:
+        rows = get_session().iterate(_make_engine_data_query("1"))
+    else:
+        rows = _iter_engine_rows(variant_uids, chunk_size)
+    return {row["UID"]: get_engine_row_digest(row) for row in rows}
+
+
+def get_engine_row_digest(row):
+    """
+    Returns:
+        the digest get_engine_digests() gives for a row returned by get_engine_row()
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in row:
+        value_bytes = value if isinstance(value, bytes) else repr(value).encode("utf-8")
+        digest.update(len(value_bytes).to_bytes(8, "little"))
+        digest.update(value_bytes)
+    return digest.hexdigest()
+
+
+ENGINE_CURVES = tuple(sorted(get_engine_graph_data_params()))
+ENGINE_FIELDS = tuple(sorted(get_engine_data_params() - set(ENGINE_CURVES)))
+
+
+class EngineRecord(collections.abc.Mapping):
+    """
+    The data get_engine_data() returns held in slots rather than a dict. The curves share one read-only
+    float64 array with a row per curve (in ENGINE_CURVES order) and are exposed as attributes that are views
+    of it. Every value can be read as an attribute (record.PeakPower) or by key (record["PeakPower"]) so a
+    record can be used anywhere the engine data dict is read
+    """
+    __slots__ = ENGINE_FIELDS + ("curves",)
+
+    def __init__(self, values, curves):
+        """
+        Args:
+            values: a mapping holding every key in ENGINE_FIELDS
+            curves: a 2-D array with a row per curve in ENGINE_CURVES order, or a sequence of 1-D arrays if
+                    the curves aren't all the same length
+        """
+        for field in ENGINE_FIELDS:
+            setattr(self, field, values[field])
+        self.curves = curves
+
+    @classmethod
+    def from_row(cls, row):
+        curves = decode_curve_blobs(row[curve] for curve in ENGINE_CURVES)
+        if len({len(curve) for curve in curves}) == 1:
+            curves = np.stack(curves)
+            curves.flags.writeable = False
+        else:
+            for curve in curves:
+                curve.flags.writeable = False
+            curves = tuple(curves)
+        return cls(row, curves)
+
+    def __getitem__(self, key):
+        if key not in _ENGINE_KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(ENGINE_FIELDS + ENGINE_CURVES)
+
+    def __len__(self):
+        return len(_ENGINE_KEYS)
+
+    def __contains__(self, key):
+        return key in _ENGINE_KEYS
+
+    def __repr__(self):
+        return f"EngineRecord(UID={self.UID!r}, FamilyName={self.FamilyName!r}, Name={self.Name!r})"
+
+    def to_dict(self):
+        """
+        Returns:
+            the values as a plain dict with the curves as lists so it can be written out as TOML or JSON
+        """
+        return {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in self.items()}
+
+
+_ENGINE_KEYS = frozenset(ENGINE_FIELDS + ENGINE_CURVES)
+for _idx, _curve in enumerate(ENGINE_CURVES):
+    setattr(EngineRecord, _curve, property(lambda self, idx=_idx: self.curves[idx]))
+
+
+def get_engine_record(variant_uid):
+    """
+    The same as get_engine_data() but returns an EngineRecord
+    Raises:
+        KeyError if no complete engine with that UID exists in the sandbox
+    """
+    return EngineRecord.from_row(get_engine_row(variant_uid))
+
+
+def get_engine_records(variant_uids=None, chunk_size=500):
+    """
+    The same as get_engine_data_many() but yields EngineRecords
+    """
+    for row in _iter_engine_rows(variant_uids, chunk_size):
+        yield EngineRecord.from_row(row)
+
+
+class EngineNameIndex(object):
+    """
+    An in-memory index of (family name, variant name) -> engine variant UID for every engine in the sandbox,
+    supporting exact, case-insensitive prefix and fuzzy lookups. Built from a single query; get_name_index()
+    keeps one per session and rebuilds it when the database changes
+    """
+    def __init__(self, rows):
+        """
+        Args:
+            rows: (family name, variant name, UID) for every engine variant. If names are duplicated the
+                  first UID is kept
+        """
+        self.uids = dict()
+        for family_name, variant_name, uid in rows:
+            self.uids.setdefault((family_name, variant_name), uid)
+        # lowercase "family\0variant" -> (family, variant), and the same keys sorted so a prefix is a range
+        self.folded_names = {f"{family}\0{variant}".casefold(): (family, variant) for family, variant in self.uids}
+        self.folded_keys = sorted(self.folded_names)
+        # lowercase family name -> the keys of its variants
+        self.folded_families = dict()
+        for key in self.folded_keys:
+            self.folded_families.setdefault(key.split("\0", 1)[0], list()).append(key)
+
+    @classmethod
+    def from_session(cls, session):
+        return cls(tuple(row) for row in session.fetchall(
+            "SELECT Families.Name, Variants.Name, Variants.UID FROM Variants "
+            "JOIN Families ON Families.UID = Variants.FUID ORDER BY Variants.rowid"))
+
+    def __len__(self):
+        return len(self.uids)
+
+    def get_uid(self, family_name, variant_name):
+        """
+        Returns:
+            the UID of the engine with exactly this family and variant name
+        Raises:
+            KeyError naming the closest matches if there is no such engine
+        """
+        try:
+            return self.uids[(family_name, variant_name)]
+        except KeyError:
+            pass
+        message = f"No engine named '{family_name}' '{variant_name}' in the sandbox"
+        suggestions = self.find_fuzzy(family_name, variant_name, max_matches=3)
+        if suggestions:
+            message += "; did you mean " + " or ".join(f"'{f}' '{v}'" for f, v, _ in suggestions)
+        raise KeyError(message)
+
+    def find_prefix(self, family_prefix, variant_prefix=""):
+        """
+        Returns:
+            a list of (family name, variant name, UID) for every engine whose family name starts with
+            family_prefix or, if variant_prefix is given, whose family name is family_prefix and whose variant
+            name starts with variant_prefix; ignoring case
+        """
+        if variant_prefix:
+            prefix = f"{family_prefix}\0{variant_prefix}".casefold()
+        else:
+            prefix = family_prefix.casefold()
+        matches = list()
+        for key in itertools.islice(self.folded_keys, bisect.bisect_left(self.folded_keys, prefix), None):
+            if not key.startswith(prefix):
+                break
+            matches.append(self._match(key))
+        return matches
+
+    def find_fuzzy(self, family_name, variant_name, max_matches=5, cutoff=0.6):
+        """
+        Returns:
+            a list of up to max_matches (family name, variant name, UID) whose names are closest to the ones
+            given, best first
+        """
+        # Narrow the search down to the variants of the closest families first so it stays quick on a
+        # sandbox with thousands of engines
+        families = difflib.get_close_matches(family_name.casefold(), self.folded_families, n=max_matches, cutoff=0)
+        candidates = [key for family in families for key in self.folded_families[family]]
+        wanted = f"{family_name}\0{variant_name}".casefold()
+        return [self._match(key) for key in difflib.get_close_matches(wanted, candidates, n=max_matches, cutoff=cutoff)]
+
+    def _match(self, folded_key):
+        family, variant = self.folded_names[folded_key]
+        return family, variant, self.uids[(family, variant)]
+
+
+def get_name_index():
+    """
+    Returns:
+        the EngineNameIndex of the current session; rebuilt if the database has changed since it was built
+    """
+    session = get_session()
+    with session.lock:
+        data_version = session.fetchone("PRAGMA data_version")[0]
+        if session.name_index is None or session.name_index_version != data_version:
+            session.name_index = EngineNameIndex.from_session(session)
+            session.name_index_version = data_version
+        return session.name_index
+
+
 def get_engine_uid_from_name(family_name, variant_name):
-    with sqlite3.connect(os.path.join(installation.get_userdata_path(),
-                                      installation.SANDBOX_DB_NAME)) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        family_row = cur.execute('SELECT * from Families where Name = ?',
-                                 (family_name,)).fetchone()
-        query = f"SELECT UID from Variants where FUID = ? and Name = ?"
-        return cur.execute(query, (family_row['UID'], variant_name)).fetchone()["UID"]
+    """
+    Raises:
+        KeyError naming the closest matches if there is no engine with these names
+    """
+    return get_name_index().get_uid(family_name, variant_name)
 
 
 def get_engine_by_name(family_name, variant_name):
     return get_engine_data(get_engine_uid_from_name(family_name, variant_name))
 
 
-def _decode_double(blob_bytes):
-    logging.debug(" ".join(f'{b:02X}' for b in blob_bytes))
-    return struct.unpack("d", bytearray(blob_bytes))[0]
-
-
-def _decode_blob(blob_bytes):
-    # skip blob header
-    logging.debug(f'Blob length: {len(blob_bytes)}')
-    data = blob_bytes[2:]
-    num_data_points = struct.unpack("<LL", bytearray(data[0:8]))[0]
-    logging.debug(f'Num data points: {num_data_points}')
-    data = data[8:]
-    current_pos = 0
-    collected_points = 0
-    out_list = list()
-    while collected_points < num_data_points:
-        logging.debug(f'{data[current_pos]:02X}')
-        current_pos += 1
-        logging.debug(f'{_decode_double(data[current_pos:current_pos+8])}')
-        current_pos += 9
-        out_list.append(_decode_double(data[current_pos:current_pos+8]))
-        current_pos += 8
-        collected_points += 1
-    return out_list
+# Curve blobs are a 2 byte header and a point count followed by fixed size records of a type tag and double
+# for the position of the point in the curve then a type tag and double for the value
+CURVE_HEADER = struct.Struct("<2xLL")
+CURVE_POINT = np.dtype([("key_type", "u1"), ("key", "<f8"), ("value_type", "u1"), ("value", "<f8")])
+
+
+def curve_point_count(blob_bytes):
+    """
+    Returns:
+        the number of points in a curve blob
+    Raises:
+        ValueError if the blob is too short to hold them
+    """
+    if len(blob_bytes) < CURVE_HEADER.size:
+        raise ValueError(f"Curve blob of {len(blob_bytes)} bytes is too short to hold a header")
+    num_data_points = CURVE_HEADER.unpack_from(blob_bytes)[0]
+    if len(blob_bytes) < CURVE_HEADER.size + num_data_points * CURVE_POINT.itemsize:
+        raise ValueError(f"Curve blob of {len(blob_bytes)} bytes is too short to hold {num_data_points} points")
+    return num_data_points
+
+
+def decode_curve_blob(blob_bytes):
+    """
+    Decode the values of a curve blob from the sandbox
+    Args:
+        blob_bytes: the raw blob
+    Returns:
+        a float64 numpy array of the curve values
+    """
+    points = np.frombuffer(blob_bytes, dtype=CURVE_POINT, count=curve_point_count(blob_bytes),
+                           offset=CURVE_HEADER.size)
+    return points["value"].copy()
+
+
+def decode_curve_blobs(blobs):
+    """
+    Decode the values of many curve blobs in one vectorised pass
+    Args:
+        blobs: an iterable of raw curve blobs
+    Returns:
+        a list of float64 numpy arrays of the curve values; one for each blob
+    """
+    counts = list()
+    records = list()
+    for blob_bytes in blobs:
+        num_data_points = curve_point_count(blob_bytes)
+        counts.append(num_data_points)
+        records.append(memoryview(blob_bytes)[CURVE_HEADER.size:CURVE_HEADER.size +
+                                              num_data_points * CURVE_POINT.itemsize])
+    values = np.frombuffer(b"".join(records), dtype=CURVE_POINT)["value"].copy()
+    return np.split(values, np.cumsum(counts[:-1])) if counts else list()
+
+
+def _curve_values(blob_bytes):
+    """
+    Returns:
+        a read-only strided view of the values of a curve blob or None if the blob is NULL or empty
+    """
+    if not isinstance(blob_bytes, bytes):
+        return None
+    num_data_points = curve_point_count(blob_bytes)
+    if num_data_points == 0:
+        return None
+    return np.frombuffer(blob_bytes, dtype=CURVE_POINT, count=num_data_points, offset=CURVE_HEADER.size)["value"]
+
+
+def _curve_len(blob_bytes):
+    return curve_point_count(blob_bytes) if isinstance(blob_bytes, bytes) else None
+
+
+def _curve_max(blob_bytes):
+    values = _curve_values(blob_bytes)
+    return None if values is None else float(values.max())
+
+
+def _curve_min(blob_bytes):
+    values = _curve_values(blob_bytes)
+    return None if values is None else float(values.min())
+
+
+def _curve_at(rpm_blob, blob_bytes, rpm):
+    rpm_values = _curve_values(rpm_blob)
+    values = _curve_values(blob_bytes)
+    if rpm_values is None or values is None or rpm is None or len(rpm_values) != len(values):
+        return None
+    if not rpm_values[0] <= rpm <= rpm_values[-1]:
+        return None
+    return float(np.interp(rpm, rpm_values, values))
+
+
+def _curve_max_between(rpm_blob, blob_bytes, min_rpm, max_rpm):
+    rpm_values = _curve_values(rpm_blob)
+    values = _curve_values(blob_bytes)
+    if rpm_values is None or values is None or len(rpm_values) != len(values):
+        return None
+    in_range = np.ones(len(values), dtype=bool)
+    if min_rpm is not None:
+        in_range &= rpm_values >= min_rpm
+    if max_rpm is not None:
+        in_range &= rpm_values <= max_rpm
+    return float(values[in_range].max()) if in_range.any() else None
+
+
+# name -> (number of arguments, implementation)
+CURVE_FUNCTIONS = {"curve_len": (1, _curve_len),
+                   "curve_max": (1, _curve_max),
+                   "curve_min": (1, _curve_min),
+                   "curve_at": (3, _curve_at),
+                   "curve_max_between": (4, _curve_max_between)}
+
+
+def register_curve_functions(conn):
+    """
+    Register SQL functions that decode curve blobs inside queries so curves can be filtered on without
+    pulling every blob into Python. Every SandboxSession connection has them:
+
+    curve_len(curve) -> the number of points in the curve
+    curve_max(curve) / curve_min(curve) -> the largest / smallest value of the curve
+    curve_at(RPMCurve, curve, rpm) -> the value of the curve at rpm, interpolated between the points either
+                                      side; NULL outside the rpm range of the curve
+    curve_max_between(RPMCurve, curve, min_rpm, max_rpm) -> the largest value of the curve in an rpm range;
+                                                            either end can be NULL to leave it open
+
+    The points of a curve have no rpm of their own so curve_at and curve_max_between take the engine's
+    RPMCurve alongside. Every function returns NULL for a NULL curve. Curves must be passed as BLOBs, e.g.
+    to find the engines making more than 400Nm below 3000rpm:
+
+    SELECT UID FROM EngineCurves
+    WHERE curve_max_between(CAST(RPMCurve AS BLOB), CAST(TorqueCurve AS BLOB), NULL, 3000) > 400
+    """
+    for name, (num_args, function) in CURVE_FUNCTIONS.items():
+        conn.create_function(name, num_args, function, deterministic=True)
+
@@ -0,0 +1,155 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import time
+import random
+import argparse
+import statistics
+from collections import OrderedDict
+
+import sim_racing_tools.automation.sandbox as sandbox
+
+
+def get_engine_data_by_table(variant_uid):
+    """
+    The original way of collecting the engine data; a query per table plus a second read of the
+    EngineResults row. Kept as the baseline the single-query lookup is measured against
+    """
+    session = sandbox.get_session()
+    variant_columns = sandbox.get_variant_data_params()
+    query = f"SELECT {', '.join(variant_columns)} from Variants where uid = ?"
+    row = session.fetchone(query, (variant_uid,))
+    data_dict = {k: row[k] for k in row.keys()}
+    family_row = session.fetchone('SELECT * from Families where uid = ?', (data_dict['FUID'],))
+    for family_key, data_key in sandbox.get_family_mapping().items():
+        data_dict[data_key] = family_row[family_key]
+    data_dict.update(sandbox.get_engine_performance_data(variant_uid))
+    data_dict.update(sandbox.get_engine_bill_of_materials(variant_uid))
+    data_dict.update(sandbox.get_engine_graph_data(variant_uid))
+    return data_dict
+
+
+LOOKUPS = OrderedDict([
+    ("by-table", get_engine_data_by_table),
+    ("join", sandbox.get_engine_data),
+])
+
+
+def get_variant_uids(limit=None, seed=0):
+    uids = [row["UID"] for row in sandbox.get_session().fetchall("SELECT UID FROM Variants")]
+    if limit is not None and limit < len(uids):
+        uids = random.Random(seed).sample(uids, limit)
+    return uids
+
+
+def time_lookup(lookup, uids, repeats=3):
+    """
+    Args:
+        lookup: a function taking an engine variant UID
+        uids: the UIDs to look up
+        repeats: how many times to look up every UID
+    Returns:
+        a dict of per-engine latency statistics in microseconds
+    """
+    latencies = list()
+    for _ in range(repeats):
+        for uid in uids:
+            start = time.perf_counter()
+            lookup(uid)
+            latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    return {"engines": len(uids),
+            "mean_us": statistics.mean(latencies),
+            "median_us": statistics.median(latencies),
+            "p95_us": latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0]}
+
+
+def time_bulk_lookup(uids, repeats=3):
+    """
+    Time get_engine_data_many fetching all the UIDs at once
+    Returns:
+        a dict of latency statistics in microseconds; the per-engine figures are averaged over each bulk fetch
+    """
+    latencies = list()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fetched = sum(1 for _ in sandbox.get_engine_data_many(uids))
+        latencies.append((time.perf_counter() - start) * 1e6 / max(fetched, 1))
+    return {"engines": len(uids),
+            "mean_us": statistics.mean(latencies),
+            "median_us": statistics.median(latencies),
+            "p95_us": max(latencies)}
+
+
+def compare_lookups(uids, repeats=3, lookup_names=None):
+    results = dict()
+    for name in lookup_names or list(LOOKUPS.keys()) + ["many"]:
+        if name == "many":
+            results[name] = time_bulk_lookup(uids, repeats)
+            continue
+        # Warm the connection and the page cache so only the lookups themselves are timed
+        LOOKUPS[name](uids[0])
+        results[name] = time_lookup(LOOKUPS[name], uids, repeats)
+    return results
+
+
+def print_results(results):
+    baseline = results.get("by-table")
+    print(f"{'lookup':<12}{'engines':>9}{'mean us':>12}{'median us':>12}{'p95 us':>12}{'speedup':>10}")
+    for name, result in results.items():
+        speedup = f"{baseline['mean_us'] / result['mean_us']:.2f}x" if baseline else "-"
+        print(f"{name:<12}{result['engines']:>9}{result['mean_us']:>12.1f}{result['median_us']:>12.1f}"
+              f"{result['p95_us']:>12.1f}{speedup:>10}")
+
+
+def lookup(args):
+    with sandbox.SandboxSession(args.database, snapshot=args.snapshot):
+        uids = get_variant_uids(args.number)
+        if not uids:
+            print("The sandbox has no engine variants to look up")
+            return 1
+        print_results(compare_lookups(uids, args.repeats, args.lookup))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for reading engine data from the Automation sandbox")
+    subparsers = parser.add_subparsers(title='Commands')
+    parser_lookup = subparsers.add_parser("lookup", help="Time the per-engine latency of get_engine_data")
+    parser_lookup.add_argument("-d", "--database", help="The sandbox database to read; defaults to Automation's")
+    parser_lookup.add_argument("-n", "--number", type=int, default=500,
+                               help="How many randomly chosen engine variants to look up")
+    parser_lookup.add_argument("-r", "--repeats", type=int, default=3, help="How many times to look up each engine")
+    parser_lookup.add_argument("-l", "--lookup", choices=list(LOOKUPS.keys()) + ["many"], action="append",
+                               help="Only time this lookup; can be given multiple times")
+    parser_lookup.add_argument("-s", "--snapshot", action="store_true",
+                               help="Query an in-memory snapshot of the database rather than the file")
+    parser_lookup.set_defaults(func=lookup)
+    args = parser.parse_args()
+    if not hasattr(args, "func"):
+        parser.print_help()
+        return 2
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import json
+from collections import namedtuple
+
+import sim_racing_tools.constants as constants
+import sim_racing_tools.utils as utils
+import sim_racing_tools.automation.sandbox as sandbox
+
+# Bump this whenever the way engines are digested changes so every engine is reported as changed once
+STATE_VERSION = 1
+DEFAULT_FEED_NAME = "default"
+
+SandboxChanges = namedtuple("SandboxChanges", ["added", "changed", "deleted"])
+
+
+def get_default_state_path(feed_name=DEFAULT_FEED_NAME):
+    return os.path.join(constants.get_cache_path(), "sandbox-changes", f"{feed_name}.json")
+
+
+class ChangeFeed(object):
+    """
+    Reports which engine variants have been added, changed or deleted in the sandbox since they were last
+    recorded so batch jobs only have to process the difference.
+
+    The state file holds a digest of everything get_engine_data() reads for each engine. scan() compares the
+    sandbox with it and record() updates it, so a job can record only the engines it processed successfully
+    and see the rest again on the next scan. Jobs that process engines independently of each other should
+    each use their own state file:
+
+    feed = ChangeFeed(get_default_state_path("ac-engines"))
+    changes = feed.scan()
+    for uid in changes.added + changes.changed:
+        fabricate(uid)
+    feed.record()
+    """
+    def __init__(self, state_path=None):
+        self.state_path = get_default_state_path() if state_path is None else state_path
+        # engine variant UID -> digest as last recorded
+        self.recorded = self._load()
+        # engine variant UID -> digest as of the last scan
+        self.scanned = None
+
+    def scan(self):
+        """
+        Returns:
+            a SandboxChanges of sorted lists of engine variant UIDs
+        """
+        self.scanned = sandbox.get_engine_digests()
+        added = sorted(uid for uid in self.scanned if uid not in self.recorded)
+        changed = sorted(uid for uid, digest in self.scanned.items()
+                         if uid in self.recorded and self.recorded[uid] != digest)
+        deleted = sorted(uid for uid in self.recorded if uid not in self.scanned)
+        return SandboxChanges(added, changed, deleted)
+
+    def record(self, variant_uids=None):
+        """
+        Record the state of engines as of the last scan and save the state file
+        Args:
+            variant_uids: the engine variant UIDs to record; every added, changed and deleted engine if None
+        """
+        if self.scanned is None:
+            raise RuntimeError("The sandbox must be scanned before its state can be recorded")
+        if variant_uids is None:
+            variant_uids = set(self.scanned) | set(self.recorded)
+        for uid in variant_uids:
+            if uid in self.scanned:
+                self.recorded[uid] = self.scanned[uid]
+            else:
+                self.recorded.pop(uid, None)
+        self._save()
+
+    def reset(self):
+        self.recorded = dict()
+        self._save()
+
+    def _load(self):
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return dict()
+        if state.get("version") != STATE_VERSION:
+            return dict()
+        return state["variants"]
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        with utils.atomic_write(self.state_path, "w") as f:
+            json.dump({"version": STATE_VERSION, "variants": self.recorded}, f, indent=1, sort_keys=True)
@@ -0,0 +1,178 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import json
+import numpy as np
+
+import sim_racing_tools.automation.sandbox as sandbox
+
+VALUES_FILENAME = "values.npy"
+LENGTHS_FILENAME = "lengths.npy"
+INDEX_FILENAME = "index.json"
+DEFAULT_BATCH_SIZE = 1000
+
+
+class CurveTable(object):
+    """
+    Every curve of one or more curve columns of a sandbox table decoded into a single array.
+
+    values has the shape (rows, columns, points) and is padded with NaN past the end of each curve; lengths
+    has the shape (rows, columns) and holds how many points each curve really has. Rows are in the order of
+    uids and index maps a UID to its row. The arrays can be held in memory or in .npy files in a directory
+    that can be memory-mapped again later with CurveTable.load()
+    """
+    __slots__ = ("uids", "columns", "values", "lengths", "index")
+
+    def __init__(self, uids, columns, values, lengths):
+        self.uids = uids
+        self.columns = columns
+        self.values = values
+        self.lengths = lengths
+        self.index = {uid: row for row, uid in enumerate(uids)}
+
+    def __len__(self):
+        return len(self.uids)
+
+    def get(self, uid, column=None):
+        """
+        Returns:
+            the curve of the given column (the first if None) for a UID, without the padding
+        Raises:
+            KeyError if the UID isn't in the table
+        """
+        row = self.index[uid]
+        column_idx = 0 if column is None else self.columns.index(column)
+        return self.values[row, column_idx, :self.lengths[row, column_idx]]
+
+    def column(self, column):
+        """
+        Returns:
+            a (rows, points) view of every curve of one column
+        """
+        return self.values[:, self.columns.index(column), :]
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        with open(os.path.join(directory, INDEX_FILENAME), "r") as f:
+            index = json.load(f)
+        values = np.load(os.path.join(directory, VALUES_FILENAME), mmap_mode=mmap_mode)
+        lengths = np.load(os.path.join(directory, LENGTHS_FILENAME))
+        return cls(index["uids"], index["columns"], values, lengths)
+
+
+def _decode_batch_into(blobs, out_values, out_lengths):
+    """
+    Decode a batch of curve blobs into rows of a preallocated array. A batch where every curve has the same
+    number of points (the usual case) is copied in with a single vectorised assignment
+    """
+    present = [idx for idx, blob in enumerate(blobs) if blob is not None]
+    if not present:
+        return
+    curves = sandbox.decode_curve_blobs(blobs[idx] for idx in present)
+    counts = np.fromiter((len(curve) for curve in curves), dtype=np.int32, count=len(curves))
+    out_lengths[present] = counts
+    if len(present) == len(blobs) and (counts == counts[0]).all():
+        out_values[:, :counts[0]] = np.concatenate(curves).reshape(len(blobs), counts[0])
+        return
+    for idx, curve in zip(present, curves):
+        out_values[idx, :len(curve)] = curve
+
+
+def decode_curve_table(table, columns, out_dir=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Stream every row of a sandbox table and decode its curve columns into one preallocated array
+    Args:
+        table: the table to read e.g. "EngineCurves"
+        columns: the curve columns to decode
+        out_dir: a directory to write the arrays to as memory-mapped .npy files rather than holding them in
+                 memory
+        batch_size: how many rows to decode at a time
+    Returns:
+        a CurveTable
+    Raises:
+        RuntimeError if rows are added to the table while it is being read; use a snapshot session to decode
+        a sandbox Automation is writing to
+    """
+    session = sandbox.get_session()
+    blob_columns = [f"CAST({column} AS BLOB)" for column in columns]
+    # Size the array from the blob headers without pulling the blobs out of SQLite
+    sizes = session.fetchone(f"SELECT COUNT(*), {', '.join(f'MAX(curve_len({c}))' for c in blob_columns)} "
+                             f"FROM {table}")
+    num_rows = sizes[0]
+    num_points = max([size or 0 for size in sizes[1:]] + [1])
+    shape = (num_rows, len(columns), num_points)
+    if out_dir is None:
+        values = np.full(shape, np.nan, dtype=np.float64)
+    else:
+        os.makedirs(out_dir, exist_ok=True)
+        values = np.lib.format.open_memmap(os.path.join(out_dir, VALUES_FILENAME), mode="w+",
+                                           dtype=np.float64, shape=shape)
+        values[:] = np.nan
+    lengths = np.zeros((num_rows, len(columns)), dtype=np.int32)
+
+    uids = list()
+    batch = list()
+    query = f"SELECT UID, {', '.join(blob_columns)} FROM {table} ORDER BY rowid"
+    for row in session.iterate(query, batch_size=batch_size):
+        if len(uids) == num_rows:
+            raise RuntimeError(f"Rows were added to {table} while it was being decoded")
+        uids.append(row[0])
+        batch.append(row)
+        if len(batch) == batch_size:
+            _decode_rows_into(batch, len(uids) - len(batch), values, lengths)
+            batch = list()
+    if batch:
+        _decode_rows_into(batch, len(uids) - len(batch), values, lengths)
+    if len(uids) < num_rows:
+        # Rows were deleted while reading; drop the unused tail
+        values = values[:len(uids)]
+        lengths = lengths[:len(uids)]
+
+    if out_dir is not None:
+        values.flush()
+        np.save(os.path.join(out_dir, LENGTHS_FILENAME), lengths)
+        with open(os.path.join(out_dir, INDEX_FILENAME), "w") as f:
+            json.dump({"table": table, "columns": list(columns), "uids": uids}, f)
+    return CurveTable(uids, list(columns), values, lengths)
+
+
+def _decode_rows_into(rows, first_row, values, lengths):
+    end_row = first_row + len(rows)
+    for column_idx in range(values.shape[1]):
+        _decode_batch_into([row[column_idx + 1] for row in rows], values[first_row:end_row, column_idx, :],
+                           lengths[first_row:end_row, column_idx])
+
+
+def decode_engine_curves(out_dir=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Returns:
+        a CurveTable of every engine curve in the sandbox with the columns in sandbox.ENGINE_CURVES order
+    """
+    return decode_curve_table("EngineCurves", list(sandbox.ENGINE_CURVES), out_dir, batch_size)
+
+
+def decode_trim_graph_data(out_dir=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Returns:
+        a CurveTable of the GraphData of every trim in the sandbox
+    """
+    return decode_curve_table("TrimGraphData", ["GraphData"], out_dir, batch_size)
@@ -0,0 +1,243 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import json
+import zlib
+import hashlib
+import numpy as np
+
+import sim_racing_tools.utils as utils
+import sim_racing_tools.automation.sandbox as sandbox
+
+# Bump this whenever the layout of the snapshot changes so old snapshots are rewritten from scratch
+SNAPSHOT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+DEFAULT_PARTITIONS = 16
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+TABLES = ("Variants", "Families", "EngineResults", "EngineCurves")
+CURVE_TABLE = "EngineCurves"
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("The pyarrow package is needed to export a sandbox snapshot: pip install pyarrow")
+    return pyarrow
+
+
+def partition_of(uid, partitions):
+    """
+    Returns:
+        the partition the row with this UID is written to. Stable between runs so a changed row only causes
+        its own partition to be rewritten
+    """
+    return zlib.crc32(str(uid).encode("utf-8")) % partitions
+
+
+def _read_table(session, table):
+    if table == CURVE_TABLE:
+        curve_columns = sorted(sandbox.get_engine_graph_data_params())
+        select = ", ".join(["UID"] + [f"CAST({c} AS BLOB) AS {c}" for c in curve_columns])
+        query = f"SELECT {select} FROM {table} ORDER BY UID"
+    else:
+        query = f"SELECT * FROM {table} ORDER BY UID"
+    # Stream the rows so only the tuples are held rather than those and every sqlite3.Row as well
+    columns = list()
+    rows = list()
+    for row in session.iterate(query):
+        if not columns:
+            columns = list(row.keys())
+        rows.append(tuple(row))
+    return columns, rows
+
+
+def _column_type(pa, values):
+    kinds = {type(v) for v in values if v is not None}
+    if kinds == {int}:
+        return pa.int64()
+    if kinds and kinds <= {int, float}:
+        return pa.float64()
+    if kinds == {bytes}:
+        return pa.binary()
+    # SQLite columns aren't strictly typed so anything mixed is stored as text
+    return pa.string()
+
+
+def _column_array(pa, values, column_type):
+    if column_type == pa.string():
+        values = [None if v is None else str(v) for v in values]
+    return pa.array(values, type=column_type)
+
+
+def _curve_arrays(pa, blobs, curve_points):
+    """
+    Decode a column of curve blobs into a fixed-length list array padded with NaN and an array of how many
+    points of each curve were stored
+    """
+    present = [idx for idx, blob in enumerate(blobs) if blob is not None]
+    values = np.full((len(blobs), curve_points), np.nan, dtype=np.float64)
+    lengths = np.zeros(len(blobs), dtype=np.int32)
+    for idx, curve in zip(present, sandbox.decode_curve_blobs(blobs[idx] for idx in present)):
+        length = min(len(curve), curve_points)
+        values[idx, :length] = curve[:length]
+        lengths[idx] = length
+    return pa.FixedSizeListArray.from_arrays(pa.array(values.ravel()), curve_points), pa.array(lengths)
+
+
+def _build_schema(pa, table, columns, rows, curve_points):
+    fields = list()
+    for idx, column in enumerate(columns):
+        if table == CURVE_TABLE and column != "UID":
+            fields.append(pa.field(column, pa.list_(pa.float64(), curve_points)))
+            fields.append(pa.field(f"{column}Points", pa.int32()))
+        else:
+            fields.append(pa.field(column, _column_type(pa, [row[idx] for row in rows])))
+    return pa.schema(fields)
+
+
+def _build_table(pa, schema, table, columns, rows, curve_points):
+    arrays = list()
+    for idx, column in enumerate(columns):
+        values = [row[idx] for row in rows]
+        if table == CURVE_TABLE and column != "UID":
+            arrays.extend(_curve_arrays(pa, values, curve_points))
+        else:
+            arrays.append(_column_array(pa, values, schema.field(column).type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _digest_rows(rows):
+    digest = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        digest.update(repr(row).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _partition_path(output_dir, table, partition, snapshot_format):
+    return os.path.join(output_dir, table, f"part-{partition:03d}{FORMATS[snapshot_format]}")
+
+
+def _write_partition(pa, path, arrow_table, snapshot_format):
+    with utils.atomic_write(path) as f:
+        if snapshot_format == "parquet":
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(arrow_table, f)
+        else:
+            # Uncompressed IPC files can be memory-mapped and read without copying
+            with pa.ipc.new_file(f, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILENAME), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+
+def _save_manifest(output_dir, manifest):
+    with utils.atomic_write(os.path.join(output_dir, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def get_max_curve_points(session):
+    """
+    Returns:
+        the number of points in the longest curve in the sandbox, read from the blob headers inside SQLite so
+        no curve is pulled into Python
+    """
+    curve_columns = sorted(sandbox.get_engine_graph_data_params())
+    lengths = session.fetchone(f"SELECT {', '.join(f'MAX(curve_len(CAST({c} AS BLOB)))' for c in curve_columns)} "
+                               f"FROM {CURVE_TABLE}")
+    return max([length or 0 for length in lengths] + [0])
+
+
+def export_snapshot(output_dir, snapshot_format="parquet", partitions=DEFAULT_PARTITIONS, curve_points=None):
+    """
+    Export the sandbox tables the tools use to a directory of columnar files; one directory per table split
+    into partitions by UID. Curves are decoded and stored as fixed-length float64 lists padded with NaN along
+    with a <Curve>Points column holding how many of the values are real.
+
+    A manifest records a digest of the rows in every partition so re-exporting into the same directory only
+    rewrites the partitions whose rows have changed. A different format, partition count, curve length or
+    column layout rewrites everything
+    Args:
+        output_dir: the directory to write the snapshot to
+        snapshot_format: parquet or arrow (uncompressed Arrow IPC files that can be memory-mapped)
+        partitions: how many partitions to split each table into
+        curve_points: the length of the curve lists; defaults to the longest curve in the sandbox
+    Returns:
+        a dict of table name -> (partitions written, partitions unchanged, partitions removed)
+    """
+    if snapshot_format not in FORMATS:
+        raise ValueError(f"Unknown snapshot format {snapshot_format}; expected one of {', '.join(FORMATS)}")
+    pa = _import_pyarrow()
+    session = sandbox.get_session()
+    if curve_points is None:
+        curve_points = max(get_max_curve_points(session), 1)
+
+    os.makedirs(output_dir, exist_ok=True)
+    previous = _load_manifest(output_dir)
+    settings = {"version": SNAPSHOT_VERSION, "format": snapshot_format, "partitions": partitions,
+                "curve_points": curve_points}
+    if any(previous.get(k) != v for k, v in settings.items()):
+        previous = dict()
+    manifest = dict(settings, tables=dict())
+
+    results = dict()
+    for table in TABLES:
+        columns, rows = _read_table(session, table)
+        schema = _build_schema(pa, table, columns, rows, curve_points)
+        previous_table = previous.get("tables", dict()).get(table, dict())
+        previous_digests = previous_table.get("partitions", dict()) \
+            if previous_table.get("schema") == schema.to_string() else dict()
+
+        uid_index = columns.index("UID") if rows else 0
+        partitioned_rows = dict()
+        for row in rows:
+            partitioned_rows.setdefault(partition_of(row[uid_index], partitions), list()).append(row)
+        os.makedirs(os.path.join(output_dir, table), exist_ok=True)
+        digests = dict()
+        written = 0
+        for partition, partition_rows in sorted(partitioned_rows.items()):
+            digest = _digest_rows(partition_rows)
+            digests[str(partition)] = digest
+            path = _partition_path(output_dir, table, partition, snapshot_format)
+            if previous_digests.get(str(partition)) == digest and os.path.exists(path):
+                continue
+            _write_partition(pa, path, _build_table(pa, schema, table, columns, partition_rows, curve_points),
+                             snapshot_format)
+            written += 1
+
+        # Partitions that are now empty or were written in another format
+        expected = {os.path.basename(_partition_path(output_dir, table, p, snapshot_format)) for p in partitioned_rows}
+        removed = 0
+        for file_name in os.listdir(os.path.join(output_dir, table)):
+            if file_name.startswith("part-") and file_name not in expected:
+                os.remove(os.path.join(output_dir, table, file_name))
+                removed += 1
+        manifest["tables"][table] = {"schema": schema.to_string(), "rows": len(rows), "partitions": digests}
+        results[table] = (written, len(partitioned_rows) - written, removed)
+    _save_manifest(output_dir, manifest)
+    return results
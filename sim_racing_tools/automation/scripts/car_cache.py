@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# PYTHON_ARGCOMPLETE_OK
+
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argcomplete
+import argparse
+
+parser = argparse.ArgumentParser(description='Inspect or clear the cache of decoded Automation .car files')
+parser.add_argument("-d", "--cache-dir", type=str, help="Use the cache in this directory rather than the default one")
+subparsers = parser.add_subparsers(title='Commands')
+parser_info = subparsers.add_parser('info', help="Show where the cache is, how large it is and the files in it")
+parser_clear = subparsers.add_parser('clear', help="Remove everything from the cache")
+argcomplete.autocomplete(parser)
+
+
+def info(args):
+    import datetime
+    from sim_racing_tools.automation.car_file_cache import CarFileCache
+    cache = CarFileCache(args.cache_dir)
+    print(f"Cache directory: {cache.cache_dir}")
+    print(f"Size: {cache.size_bytes / 1048576:.2f} MiB of {cache.max_size_bytes / 1048576:.2f} MiB "
+          f"in {len(cache.entries)} entries")
+    for path, content_hash, entry_size, last_used in cache.summary():
+        print(f"{datetime.datetime.fromtimestamp(last_used):%Y-%m-%d %H:%M:%S}  {entry_size:>10}  "
+              f"{content_hash}  {path}")
+    return 0
+
+
+def clear(args):
+    from sim_racing_tools.automation.car_file_cache import CarFileCache
+    cache = CarFileCache(args.cache_dir)
+    num_entries = len(cache.entries)
+    cache.clear()
+    print(f"Removed {num_entries} entries from {cache.cache_dir}")
+    return 0
+
+
+def main():
+    import sys
+    parser_info.set_defaults(func=info)
+    parser_clear.set_defaults(func=clear)
+    args = parser.parse_args()
+    if not hasattr(args, "func"):
+        parser.print_help()
+        sys.exit(2)
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -35,6 +35,10 @@ engine_source_group.add_argument('-c', "--exported-car-path", type=str,
                                  help="A path to an exported car - the engine of the car will be checked. "
                                       "Can be a full path to an exported zip file or unpacked folder,"
                                       " or the name of a zip file or unpacked folder in the BeamNG mod directory")
+engine_source_group.add_argument('-s', "--search", action="store_true",
+                                 help="Search the whole sandbox and list every engine that meets the criteria")
+parser.add_argument('-f', "--failing", action="store_true",
+                    help="When searching list the engines that don't meet the criteria and why instead")
 parser.add_argument('spec_file', help="A file containing the criteria which the engine must meet")
 
 
@@ -43,6 +47,8 @@ def main():
     import sim_racing_tools.automation.scripts.scrutineering_impl as scrutineering_impl
     parser.set_defaults(func=scrutineering_impl.validate_engine)
     args = parser.parse_args()
+    if args.failing and not args.search:
+        parser.error("-f/--failing can only be used with -s/--search")
     sys.exit(args.func(args))
 
 
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# PYTHON_ARGCOMPLETE_OK
+
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argcomplete
+import argparse
+
+parser = argparse.ArgumentParser(description='Index the cars exported from Automation to BeamNG')
+parser.add_argument("-i", "--index", type=str, help="The index file to use rather than the default one")
+subparsers = parser.add_subparsers(title='Commands')
+parser_build = subparsers.add_parser('build', help="Decode every exported car and update the index")
+parser_build.add_argument("-m", "--mods-dir", type=str, action="append",
+                          help="A BeamNG mod directory to search; can be given multiple times. "
+                               "Defaults to all of the BeamNG mod directories")
+parser_build.add_argument("-j", "--jobs", type=int, help="The number of worker processes to decode with")
+parser_find = subparsers.add_parser('find', help="List the exported cars matching the given criteria")
+find_group = parser_find.add_mutually_exclusive_group(required=True)
+find_group.add_argument('-u', "--variant-uid", type=str, help="Find the exports using the engine variant with this UID")
+find_group.add_argument('-f', "--mod-folder", type=str, help="Show what is in the export with this folder name")
+argcomplete.autocomplete(parser)
+
+
+def build(args):
+    import sim_racing_tools.automation.export_index as export_index
+    decoded, unchanged, removed = export_index.build_index(args.index, args.mods_dir, args.jobs)
+    print(f"Decoded {decoded} .car files, {unchanged} unchanged, {removed} removed")
+    return 0
+
+
+def find(args):
+    import sim_racing_tools.automation.export_index as export_index
+    if args.variant_uid:
+        rows = export_index.find_exports(args.index, VariantUID=args.variant_uid)
+    else:
+        rows = export_index.find_exports(args.index, ModFolder=args.mod_folder)
+    for row in rows:
+        location = row["Source"] if not row["Member"] else f"{row['Source']}:{row['Member']}"
+        if row["Error"]:
+            print(f"{row['ModFolder']}: couldn't be decoded ({row['Error']}) - {location}")
+            continue
+        print(f"{row['ModFolder']}: {row['FamilyName']} {row['VariantName']} ({row['VariantUID']}) "
+              f"trim {row['TrimName']} - {location}")
+    return 0 if rows else 1
+
+
+def main():
+    import sys
+    parser_build.set_defaults(func=build)
+    parser_find.set_defaults(func=find)
+    args = parser.parse_args()
+    if not hasattr(args, "func"):
+        parser.print_help()
+        sys.exit(2)
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
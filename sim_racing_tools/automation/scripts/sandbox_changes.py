@@ -0,0 +1,77 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argcomplete
+import argparse
+
+parser = argparse.ArgumentParser(description='List the engines added, changed or deleted in the Automation sandbox '
+                                             'since the state was last recorded')
+state_group = parser.add_mutually_exclusive_group()
+state_group.add_argument("-n", "--name", type=str, default="default",
+                         help="The name of the change feed; use a different one for each job that processes changes")
+state_group.add_argument("-s", "--state-file", type=str, help="The state file to use rather than a named feed")
+parser.add_argument("-d", "--database", type=str, help="The sandbox database to read rather than Automation's")
+parser.add_argument("-r", "--record", action="store_true",
+                    help="Record the current state so these changes aren't listed again")
+parser.add_argument("-e", "--exports", action="store_true",
+                    help="Also list the cars exported to BeamNG that use each added or changed engine. "
+                         "Uses the index built by export-index")
+argcomplete.autocomplete(parser)
+
+
+def export_index_exists():
+    import os
+    import sim_racing_tools.automation.export_index as export_index
+    if os.path.isfile(export_index.get_default_index_path()):
+        return True
+    print("The exports can't be listed as the export index hasn't been built; run 'export-index build' first")
+    return False
+
+
+def print_exports(variant_uid):
+    import sim_racing_tools.automation.export_index as export_index
+    for row in export_index.find_exports(VariantUID=variant_uid):
+        print(f"    exported as {row['ModFolder']}")
+
+
+def main():
+    import sys
+    args = parser.parse_args()
+    import sim_racing_tools.automation.sandbox as sandbox
+    import sim_racing_tools.automation.sandbox_changes as sandbox_changes
+    state_path = args.state_file if args.state_file else sandbox_changes.get_default_state_path(args.name)
+    feed = sandbox_changes.ChangeFeed(state_path)
+    with sandbox.SandboxSession(args.database):
+        changes = feed.scan()
+    list_exports = args.exports and export_index_exists()
+    for label, variant_uids in zip(["added", "changed", "deleted"], changes):
+        for variant_uid in variant_uids:
+            print(f"{label}: {variant_uid}")
+            if list_exports and label != "deleted":
+                print_exports(variant_uid)
+    print(f"{len(changes.added)} added, {len(changes.changed)} changed, {len(changes.deleted)} deleted")
+    if args.record:
+        feed.record()
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argcomplete
+import argparse
+
+parser = argparse.ArgumentParser(description='Export the Automation sandbox engine tables to columnar files')
+parser.add_argument("output_dir", type=str, help="The directory to write the snapshot to; "
+                                                 "an existing snapshot there is updated incrementally")
+parser.add_argument("-f", "--format", type=str, choices=["parquet", "arrow"], default="parquet",
+                    help="Write Parquet files or uncompressed Arrow IPC files that can be memory-mapped")
+parser.add_argument("-p", "--partitions", type=int, default=16, help="How many partitions to split each table into")
+parser.add_argument("-c", "--curve-points", type=int,
+                    help="The length to store every curve as; defaults to the longest curve in the sandbox")
+parser.add_argument("-d", "--database", type=str, help="The sandbox database to export rather than Automation's")
+argcomplete.autocomplete(parser)
+
+
+def main():
+    import sys
+    args = parser.parse_args()
+    import sim_racing_tools.automation.sandbox as sandbox
+    import sim_racing_tools.automation.sandbox_snapshot as sandbox_snapshot
+    with sandbox.SandboxSession(args.database):
+        results = sandbox_snapshot.export_snapshot(args.output_dir, args.format, args.partitions, args.curve_points)
+    for table, (written, unchanged, removed) in results.items():
+        print(f"{table}: {written} partitions written, {unchanged} unchanged, {removed} removed")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -23,6 +23,7 @@ import toml
 import glob
 import sim_racing_tools.automation.installation as auto_install
 import sim_racing_tools.automation.sandbox as sandbox
+import sim_racing_tools.automation.engine_data_cache as engine_data_cache
 from sim_racing_tools.automation.car_file_decoder import CarFile
 
 SUCCESS = 0
@@ -34,6 +35,10 @@ def validate_engine(args):
     if not os.path.isfile(args.spec_file):
         print(f"The file {args.spec_file} doesn't exist or is inaccessible")
         return ARGUMENT_ERROR
+    if args.search:
+        return search_engines(args)
+
+    engine_cache = engine_data_cache.EngineDataCache(cache_dir=engine_data_cache.get_default_cache_dir())
 
     if args.exported_car_path:
         if os.path.isabs(args.exported_car_path):
@@ -47,19 +52,21 @@ def validate_engine(args):
             print(f"No .car file present in {data_dir}")
             return ARGUMENT_ERROR
 
-        with open(car_file, "rb") as f:
-            car = CarFile(os.path.basename(car_file), f.read())
-            car.parse()
-            uid = car.get_data()['Car']['Variant']['UID']
+        with CarFile.open(car_file) as car:
+            uid = car.get("Car/Variant/UID")
     elif args.variant_uid:
         uid = args.variant_uid
     elif args.name:
-        uid = sandbox.get_engine_uid_from_name(args.name[0], args.name[1])
+        try:
+            uid = engine_cache.get_engine_uid_from_name(args.name[0], args.name[1])
+        except KeyError as e:
+            print(e.args[0])
+            return ARGUMENT_ERROR
     else:
         print("No method for getting Variant UID provided")
         return ARGUMENT_ERROR
 
-    engine_db_data = sandbox.get_engine_data(uid)
+    engine_db_data = engine_cache.get_engine_record(uid)
     try:
         spec_data = toml.load(args.spec_file)
     except TypeError as e:
@@ -105,3 +112,95 @@ def validate_engine(args):
                 return FAILURE
     print(f"Engine meets specifications")
     return SUCCESS
+
+
+def compile_spec(spec_data):
+    """
+    Compile the checks in a spec into SQL conditions over the Variants, Families and EngineResults tables.
+    Each condition is true when an engine fails the check; an engine with no value for a parameter fails
+    any check on it
+    Args:
+        spec_data: the parsed spec file
+    Returns:
+        a tuple of (list of (condition, failure reason), list of query parameters, list of ignored keys).
+        The conditions use positional parameters and must be used in order
+    """
+    columns = {key: expression for expression, key in sandbox.get_engine_data_columns()
+               if key not in sandbox.get_engine_graph_data_params()}
+    conditions = list()
+    parameters = list()
+    ignored = list()
+    for key, checks in spec_data.items():
+        if key not in columns:
+            ignored.append(key)
+            continue
+        column = columns[key]
+        if "min" in checks:
+            conditions.append((f"{column} < ?", f"{key} is less than configured min of {checks['min']}"))
+            parameters.append(checks["min"])
+        if "max" in checks:
+            conditions.append((f"{column} > ?", f"{key} is more than configured max of {checks['max']}"))
+            parameters.append(checks["max"])
+        if "not" in checks:
+            values = checks["not"] if isinstance(checks["not"], list) else [checks["not"]]
+            conditions.append((f"{column} IN ({', '.join('?' * len(values))})",
+                               f"{key} is equal to {checks['not']}"))
+            parameters.extend(values)
+        if "equals" in checks:
+            conditions.append((f"{column} != ?", f"{key} is not equal to {checks['equals']}"))
+            parameters.append(checks["equals"])
+        if "one_of" in checks:
+            values = checks["one_of"]
+            conditions.append((f"{column} NOT IN ({', '.join('?' * len(values))})",
+                               f"{key} is not one of {', '.join(str(v) for v in values)}"))
+            parameters.extend(values)
+    return conditions, parameters, ignored
+
+
+def find_engines(spec_data, failing=False):
+    """
+    Check every engine in the sandbox against a spec in a single query
+    Args:
+        spec_data: the parsed spec file
+        failing: return the engines that fail the spec rather than those that pass
+    Returns:
+        a tuple of (list of (UID, family name, variant name, list of failure reasons), list of ignored keys)
+    """
+    conditions, parameters, ignored = compile_spec(spec_data)
+    select = ["Variants.UID AS UID", "Families.Name AS FamilyName", "Variants.Name AS Name"]
+    select.extend(f"COALESCE({condition}, 1) AS Failed{idx}" for idx, (condition, _) in enumerate(conditions))
+    query = f"SELECT {', '.join(select)} " \
+            f"FROM Variants " \
+            f"JOIN Families ON Families.UID = Variants.FUID " \
+            f"JOIN EngineResults ON EngineResults.UID = Variants.UID"
+    if conditions:
+        any_failed = " OR ".join(f"Failed{idx}" for idx in range(len(conditions)))
+        query = f"SELECT * FROM ({query}) WHERE {'' if failing else 'NOT '}({any_failed})"
+    elif failing:
+        return list(), ignored
+    engines = list()
+    for row in sandbox.get_session().fetchall(f"{query} ORDER BY FamilyName, Name", parameters):
+        reasons = [reason for idx, (_, reason) in enumerate(conditions) if row[f"Failed{idx}"]]
+        engines.append((row["UID"], row["FamilyName"], row["Name"], reasons))
+    return engines, ignored
+
+
+def search_engines(args):
+    try:
+        spec_data = toml.load(args.spec_file)
+    except TypeError as e:
+        print(f"Couldn't parse spec file: {str(e)}")
+        return ARGUMENT_ERROR
+
+    engines, ignored = find_engines(spec_data, args.failing)
+    for key in ignored:
+        print(f"Ignoring {key} in {args.spec_file}")
+    for uid, family_name, variant_name, reasons in engines:
+        if args.failing:
+            print(f"{family_name} {variant_name} ({uid}) doesn't meet specifications: {'; '.join(reasons)}")
+        else:
+            print(f"{family_name} {variant_name} ({uid}) meets specifications")
+    print(f"{len(engines)} engines {'fail' if args.failing else 'meet'} the specifications")
+    if args.failing:
+        return FAILURE if engines else SUCCESS
+    return SUCCESS if engines else FAILURE
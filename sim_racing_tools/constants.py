@@ -40,3 +40,11 @@ def get_game_install_path():
 
 def get_wine_prefix_path(game_id):
     return os.path.join(LINUX_WINE_PREFIX_PATH, os.sep.join([str(game_id), "pfx"]))
+
+
+def get_cache_path():
+    if sys.platform == "win32":
+        base_path = os.environ.get("LOCALAPPDATA", os.path.join(USER_HOME_DIR, os.sep.join(["AppData", "Local"])))
+    else:
+        base_path = os.environ.get("XDG_CACHE_HOME", os.path.join(USER_HOME_DIR, ".cache"))
+    return os.path.join(base_path, "sim-racing-tools")
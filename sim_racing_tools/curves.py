@@ -0,0 +1,140 @@
+"""
+Copyright (c):
+2021 zephyrj
+zephyrj@protonmail.com
+
+This file is part of sim-racing-tools.
+
+sim-racing-tools is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sim-racing-tools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
+"""
+import numpy as np
+
+KW_PER_BHP = 0.745699872
+# Power (kW) = Torque (Nm) * RPM / (60000 / 2pi)
+NM_RPM_PER_KW = 60000 / (2 * np.pi)
+# Power (hp) = Torque (lb-ft) * RPM / 5252
+LBFT_RPM_PER_HP = 5252
+
+# Every function here works on anything numpy can turn into an array. A 2-D array holds one curve per row
+# so a whole set of curves can be processed at once as long as they share an RPM grid; see resample()
+
+
+def kw_to_bhp(kw):
+    return np.asarray(kw, dtype=np.float64) / KW_PER_BHP
+
+
+def bhp_to_kw(bhp):
+    return np.asarray(bhp, dtype=np.float64) * KW_PER_BHP
+
+
+def torque_to_power_kw(torque_nm, rpm):
+    return np.asarray(torque_nm, dtype=np.float64) * np.asarray(rpm, dtype=np.float64) / NM_RPM_PER_KW
+
+
+def power_kw_to_torque(power_kw, rpm):
+    """
+    The torque in Nm at each point; 0 wherever the RPM is 0
+    """
+    rpm = np.asarray(rpm, dtype=np.float64)
+    power_kw = np.asarray(power_kw, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(rpm != 0, power_kw * NM_RPM_PER_KW / rpm, 0.0)
+
+
+def torque_to_hp(torque_lbft, rpm):
+    return np.asarray(torque_lbft, dtype=np.float64) * np.asarray(rpm, dtype=np.float64) / LBFT_RPM_PER_HP
+
+
+def remove_boost(torque, boost_bar):
+    """
+    Scale torque back to what it would be without the boost; negative boost (vacuum) is treated as no boost
+    """
+    return np.asarray(torque, dtype=np.float64) / (1 + np.maximum(0, np.asarray(boost_bar, dtype=np.float64)))
+
+
+def normalise(values):
+    """
+    Scale each curve so its peak is 1
+    """
+    values = np.asarray(values, dtype=np.float64)
+    peak = np.max(values, axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(peak != 0, values / peak, 0.0)
+
+
+def round_to_int(values):
+    """
+    Round each point to the nearest integer the same way the builtin round() does (halves go to even)
+
+    Returns:
+        a list (of lists for 2-D input) of python ints
+    """
+    return np.rint(np.asarray(values, dtype=np.float64)).astype(np.int64).tolist()
+
+
+def rpm_grid(rpm_curves, step):
+    """
+    An RPM grid running from the lowest to the highest RPM in rpm_curves in increments of step
+    """
+    lowest = min(np.min(rpm) for rpm in rpm_curves)
+    highest = max(np.max(rpm) for rpm in rpm_curves)
+    return np.arange(lowest, highest + step / 2, step, dtype=np.float64)
+
+
+def resample(rpm, values, grid_rpm, fill_value=np.nan):
+    """
+    Linearly interpolate a curve onto grid_rpm. Points of the grid outside the range of rpm are set to
+    fill_value rather than being extrapolated
+    """
+    return np.interp(grid_rpm, np.asarray(rpm, dtype=np.float64), np.asarray(values, dtype=np.float64),
+                     left=fill_value, right=fill_value)
+
+
+def resample_all(curves, grid_rpm, fill_value=np.nan):
+    """
+    Resample a number of (rpm, values) curves onto the same grid
+
+    Returns:
+        a 2-D array with a row for each curve
+    """
+    out = np.empty((len(curves), len(grid_rpm)), dtype=np.float64)
+    for idx, (rpm, values) in enumerate(curves):
+        out[idx] = resample(rpm, values, grid_rpm, fill_value)
+    return out
+
+
+def find_peak(rpm, values):
+    """
+    Find the highest point of each curve, ignoring NaN. rpm can be a single grid shared by every curve
+
+    Returns:
+        (rpm at the peak, peak value); scalars for a single curve or arrays with one entry per curve
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rpm = np.broadcast_to(np.asarray(rpm, dtype=np.float64), values.shape)
+    peak_idx = np.expand_dims(np.nanargmax(values, axis=-1), -1)
+    peak_rpm = np.take_along_axis(rpm, peak_idx, axis=-1)[..., 0]
+    peak_value = np.take_along_axis(values, peak_idx, axis=-1)[..., 0]
+    if values.ndim == 1:
+        return float(peak_rpm), float(peak_value)
+    return peak_rpm, peak_value
+
+
+def integrate(rpm, values):
+    """
+    The area under each curve using the trapezoidal rule e.g. to compare how much torque two engines make
+    across their rev range
+    """
+    trapezoid = getattr(np, "trapezoid", None) or np.trapz
+    return trapezoid(np.asarray(values, dtype=np.float64), np.asarray(rpm, dtype=np.float64), axis=-1)
@@ -21,6 +21,8 @@ along with sim-racing-tools. If not, see <https://www.gnu.org/licenses/>.
 import os
 import re
 import zipfile
+import tempfile
+import contextlib
 import decimal
 import locale
 import struct
@@ -41,6 +43,27 @@ def create_filename_safe_name(in_name):
     return re.sub(r"\s+", '_', normalized)
 
 
+@contextlib.contextmanager
+def atomic_write(path, mode="wb"):
+    """
+    Write a file in one step so nothing ever reads it half written. The file object handed out writes to a
+    temporary file next to path which replaces path once the block completes; if the block raises the
+    temporary file is removed and path is left as it was
+
+    e.g.
+    with atomic_write(path, "w") as f:
+        json.dump(data, f)
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
 def round_up(x, place=0):
     context = decimal.getcontext()
     # get the original setting so we can put it back when we're done
@@ -0,0 +1,70 @@
+import pytest
+
+from sim_racing_tools.automation.car_file_decoder import CarFile, patch_car_files
+from sim_racing_tools.automation.car_file_benchmark import CORPUS, generate_car_file
+
+
+@pytest.mark.parametrize("corpus_name", ["small", "deep", "text-heavy", "blob-heavy"])
+def test_unmodified_file_round_trips(corpus_name):
+    car_bytes = generate_car_file(**CORPUS[corpus_name])
+    assert CarFile(corpus_name, car_bytes).encode() == car_bytes
+
+
+def test_key_blob_prefix_round_trips():
+    car_bytes = generate_car_file(depth=2, attributes_per_section=4, sections_per_section=2, key_blob_size=7)
+    car = CarFile("key-blob", car_bytes)
+    assert car.encode() == car_bytes
+    assert car.get_data()["Car"]["Attribute0"] == CarFile("key-blob", car_bytes).get("Car/Attribute0")
+
+
+def test_changed_value_keeps_key_blob_prefix():
+    car_bytes = generate_car_file(depth=1, attributes_per_section=4, sections_per_section=1, key_blob_size=7)
+    car = CarFile("key-blob", car_bytes)
+    car.parse()
+    car.sections[0].attribute_list[0].value = 12.5
+    encoded = car.encode()
+    assert len(encoded) == len(car_bytes)
+    reparsed = CarFile("key-blob", encoded)
+    assert reparsed.get("Car/Attribute0") == 12.5
+    assert reparsed.encode() == encoded
+
+
+def test_parse_twice_is_a_no_op():
+    car_bytes = generate_car_file(**CORPUS["small"])
+    car = CarFile("small", car_bytes)
+    car.parse()
+    data = car.get_data()
+    car.parse()
+    assert car.get_data() == data
+    assert car.encode() == car_bytes
+
+
+def test_patch_car_files(tmp_path):
+    paths = list()
+    for seed in range(3):
+        paths.append(tmp_path / f"{seed}.car")
+        paths[-1].write_bytes(generate_car_file(depth=1, attributes_per_section=4, sections_per_section=1, seed=seed))
+    before = [CarFile(path.name, path.read_bytes()).get("Car/Attribute0") for path in paths]
+    old_values = patch_car_files(paths, {"Car/Attribute0": lambda v: v * 2})
+    assert [old_values[path]["Car/Attribute0"] for path in paths] == before
+    assert [CarFile(path.name, path.read_bytes()).get("Car/Attribute0") for path in paths] == [v * 2 for v in before]
+
+
+def test_patch_car_files_leaves_every_file_untouched_if_one_is_missing_a_path(tmp_path):
+    paths = [tmp_path / "wide.car", tmp_path / "narrow.car"]
+    paths[0].write_bytes(generate_car_file(depth=1, attributes_per_section=8, sections_per_section=1))
+    paths[1].write_bytes(generate_car_file(depth=1, attributes_per_section=4, sections_per_section=1))
+    contents = [path.read_bytes() for path in paths]
+    with pytest.raises(KeyError):
+        patch_car_files(paths, {"Car/Attribute0": 1.0, "Car/Attribute4": 2.0})
+    assert [path.read_bytes() for path in paths] == contents
+
+
+def test_write_over_opened_file(tmp_path):
+    path = tmp_path / "car.car"
+    path.write_bytes(generate_car_file(depth=1, attributes_per_section=4, sections_per_section=1))
+    with CarFile.open(str(path)) as car:
+        car.parse()
+        car.sections[0].attribute_list[0].value = 3.5
+        car.write(str(path))
+    assert CarFile(path.name, path.read_bytes()).get("Car/Attribute0") == 3.5
@@ -0,0 +1,60 @@
+import pytest
+
+from sim_racing_tools.automation.jbeam import Parser
+
+
+def parse(text):
+    return Parser().parse_string(text)
+
+
+def test_comments():
+    text = """{
+    // a whole line comment
+    "url": "http://example.com", // a trailing comment
+    /* a block
+       comment */ "value": 1
+}"""
+    assert parse(text) == {"url": "http://example.com", "value": 1}
+
+
+def test_missing_and_trailing_commas():
+    assert parse('{"a": 1 "b": [1 2, 3,] "c": {"d": "e",},}') == {"a": 1, "b": [1, 2, 3], "c": {"d": "e"}}
+
+
+def test_multi_line_arrays():
+    text = """{
+    "torque": [
+        ["rpm", "torque"]
+        [0, 0],
+        [500, 120.5],
+        [1000, -3.25]
+    ]
+}"""
+    assert parse(text) == {"torque": [["rpm", "torque"], [0, 0], [500, 120.5], [1000, -3.25]]}
+
+
+def test_literals_and_numbers():
+    data = parse('{"t": true, "f": false, "n": null, "int": -4, "float": .5, "exp": 1.5e3}')
+    assert data == {"t": True, "f": False, "n": None, "int": -4, "float": 0.5, "exp": 1500.0}
+    assert type(data["int"]) == int
+    assert data["f"] is False
+
+
+def test_nested_containers():
+    assert parse('{"a": {"b": [{"c": [[]]}, {}]}}') == {"a": {"b": [{"c": [[]]}, {}]}}
+
+
+def test_naive_parse(tmp_path):
+    path = tmp_path / "engine.jbeam"
+    path.write_text('{"Camso_Engine": {"mainEngine": {"idleRPM": 900}}}')
+    assert Parser().naive_parse(str(path)) == {"Camso_Engine": {"mainEngine": {"idleRPM": 900}}}
+
+
+@pytest.mark.parametrize("text, line", [('{\n"a": [1,\n2\n', 4),
+                                        ('{\n"a": [1,\n2}\n}', 3),
+                                        ('{\n"a": {"b": 1]\n}', 2),
+                                        ('{\n"a" 1\n}', 2),
+                                        ('{\n"a": 1\n}\n}', 4)])
+def test_errors_report_the_line(text, line):
+    with pytest.raises(ValueError, match=f"^Error on line {line}:"):
+        parse(text)